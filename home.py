@@ -1,21 +1,18 @@
 ################################################################################
 # %% IMPORTAÇÕES
-import geopandas as gpd # para trabalhar com os dados geográficos
-
 # from joblib import load # para importar o modelo
 
-# import numpy as np
-from numpy  import digitize, inf as infinito
+import json
 
 import pydeck as pdk
-import shapely
 import streamlit as st # interface WEB - https://streamlit.io/
 
-# arquivos utilizados
-from notebooks.src.config import(
-    DADOS_GEO_MEDIAN,
-#     MODELO_FINAL
-)
+from notebooks.src.atributos import escalar_renda
+from notebooks.src.cache_previsoes import CachePrevisoes
+from notebooks.src.condados import construir_tabela_condados, entrada_modelo_condado
+from notebooks.src.geometrias import PAYLOAD_MAXIMO_KB, carregar_poligonos
+from notebooks.src.malha import carregar_malha
+from notebooks.src.superficie import SuperficiePrevisoes
 
 
 ################################################################################
@@ -24,55 +21,29 @@ from notebooks.src.config import(
 # Python primitives, dataframe e API calls
 
 @st.cache_data
-def carregar_dados_geo():
-    # import geopandas as gpd
-    # from notebooks.src.config import DADOS_GEO_MEDIAN
-    # import shapely
-
-    # return gpd.read_parquet(DADOS_GEO_MEDIAN) # as camadas não funcionan sem o tratamento abaixo criado pelo Chat GPT
-    gdf_geo = gpd.read_parquet(DADOS_GEO_MEDIAN)
-
-    # Explode MultiPolygons into individual polygons
-    gdf_geo = gdf_geo.explode(ignore_index=True)
-
-    # Function to check and fix invalid geometries
-    def fix_and_orient_geometry(geometry):
-        if not geometry.is_valid:
-            geometry = geometry.buffer(0)  # Fix invalid geometry
-        # Orient the polygon to be counter-clockwise if it's a Polygon or MultiPolygon
-        if isinstance(
-            geometry, (shapely.geometry.Polygon, shapely.geometry.MultiPolygon)
-        ):
-            geometry = shapely.geometry.polygon.orient(geometry, sign=1.0)
-        return geometry
-
-    # Apply the fix and orientation function to geometries
-    gdf_geo["geometry"] = gdf_geo["geometry"].apply(fix_and_orient_geometry)
-
-    # Extract polygon coordinates
-    def get_polygon_coordinates(geometry):
-        return (
-            [[[x, y] for x, y in geometry.exterior.coords]]
-            if isinstance(geometry, shapely.geometry.Polygon)
-            else [
-                [[x, y] for x, y in polygon.exterior.coords]
-                for polygon in geometry.geoms
-            ]
-        )
-    
-    # Apply the coordinate conversion and store in a new column
-    gdf_geo["geometry"] = gdf_geo["geometry"].apply(get_polygon_coordinates)
+def carregar_dados_geo(zoom):
+    # polígonos já corrigidos, orientados e simplificados por
+    # notebooks/src/geometrias.py; gerados na primeira execução se não existirem.
+    # o pydeck não informa o zoom atual, então o nível de detalhe é o do
+    # max_zoom do mapa, limitado pelo tamanho do JSON
+    return carregar_poligonos(zoom=zoom, payload_maximo_kb=PAYLOAD_MAXIMO_KB)
 
-    return gdf_geo
 
+@st.cache_data
+def carregar_dados_malha(zoom):
+    # setores censitários agregados em hexágonos por notebooks/src/malha.py,
+    # com valor e renda medianos por célula; apenas a resolução servida é lida,
+    # escolhida como a dos polígonos
+    return carregar_malha(zoom=zoom, payload_maximo_kb=PAYLOAD_MAXIMO_KB)
 
 
 
 
 
 @st.cache_data
-def get_nomes_condados():
-    return sorted(gdf_geo['name'].unique())
+def carregar_tabela_condados():
+    # uma linha por condado, indexada pelo nome, com as medianas usadas no modelo
+    return construir_tabela_condados()
 
 
 ################################################################################
@@ -80,19 +51,40 @@ def get_nomes_condados():
 # qualquer coisa que NÃO possa ser armazenado em database
 # ML models e database connections
 
+def preparar_versao(versao):
+    # preços pré-calculados para toda a grade do formulário (condado x idade x
+    # renda) por notebooks/src/superficie.py e LRU indexado pela entrada
+    # normalizada do modelo; os dois ficam presos à versão do modelo. Cada
+    # versão do registro tem a própria superfície, gerada ao registrá-la
+    return {
+        "superficie": SuperficiePrevisoes.carregar(
+            versao.caminho_superficie, caminho_modelo=versao.caminho
+        ),
+        "cache": CachePrevisoes(),
+    }
+
+
 @st.cache_resource
-def carregar_modelo():
-    from joblib import load
-    from notebooks.src.config import MODELO_FINAL
+def carregar_modelo_ativo():
+    # versão ativa do registro (notebooks/src/registro.py), compartilhada entre
+    # as sessões; uma versão nova é preparada em segundo plano e trocada sem
+    # reiniciar o app
+    from notebooks.src.registro import ModeloAtivo
 
-    return load(MODELO_FINAL)
+    return ModeloAtivo(preparar=preparar_versao).iniciar(aquecer=False)
 
 ################################################################################
 # %% carregando arquivos ou cache
 
-gdf_geo = carregar_dados_geo()
-condados = get_nomes_condados()
-modelo = carregar_modelo()
+zoom_inicial = 4
+zoom_maximo = 10
+gdf_geo = carregar_dados_geo(zoom_maximo)
+tabela_condados = carregar_tabela_condados()
+condados = list(tabela_condados.index)
+# a versão é lida uma vez por execução: a página inteira usa o mesmo modelo
+versao_modelo = carregar_modelo_ativo().atual()
+superficie = versao_modelo.recursos["superficie"]
+cache_previsoes = versao_modelo.recursos["cache"]
 
 ################################################################################
 # %% PAGINA
@@ -117,29 +109,48 @@ with coluna1:
 
         st.form_submit_button(label='Prever preço e atualizar gráfico')
 
+    mostrar_malha = st.toggle(label='Mostrar malha hexagonal de preços')
+
 
 ################################################################################
 # %% construindo a entrada do modelo
 
-    df_valores_condado = gdf_geo[gdf_geo['name'] == selecionar_condados].reset_index() # melhor para dataframes menores, que é o caso...
-
-    #if botao_previsao: # True se clicou no botão  
-    df_valores_condado.loc[0, 'housing_median_age'] = housing_median_age
-
-    median_income /= 10 # os valores estão multiplicados por 10 mil, e estamos convertendo para 1 mil na apresentação
-    df_valores_condado.loc[0, 'median_income'] = median_income
+    median_income = escalar_renda(median_income) # os valores estão multiplicados por 10 mil, e estamos convertendo para 1 mil na apresentação
 
-    median_income_cat = digitize(x=median_income, bins=[0, 1.5, 3, 4.5, 6, infinito], right=False)
-    df_valores_condado.loc[0, 'median_income_cat'] = median_income_cat
+    # busca direta pelo nome do condado; median_income_cat é calculada na função
+    df_valores_condado = entrada_modelo_condado(
+        tabela=tabela_condados,
+        condado=selecionar_condados,
+        housing_median_age=housing_median_age,
+        median_income=median_income,
+    )
 
-    # faz a predição com os dados da tela
-    preco = modelo.predict(df_valores_condado)
+    # busca o preço no cache e, se não estiver lá, na superfície pré-calculada;
+    # entradas fora da grade do formulário são previstas pelo modelo
+    def prever_preco(condado, housing_median_age, median_income):
+        # o modelo (e o sklearn) só é carregado para entradas fora da superfície
+        preco = superficie.buscar(condado, housing_median_age, median_income)
+        if preco is None:
+            preco = superficie.prever(
+                condado, housing_median_age, median_income, versao_modelo.modelo, tabela_condados
+            )
+        return preco
+
+    preco = cache_previsoes.prever(
+        condado=selecionar_condados,
+        housing_median_age=housing_median_age,
+        median_income=median_income,
+        funcao_previsao=prever_preco,
+    )
 
     st.metric( # mostrando o preço
         label='Preço previsto (US$)',
-        value= f'{preco[0][0]:,.2f}'.replace('.', '¬').replace(',', '.').replace('¬', ','),
+        value= f'{preco:,.2f}'.replace('.', '¬').replace(',', '.').replace('¬', ','),
     )
 
+    with st.expander(label='Métricas do cache de previsões'):
+        st.json(cache_previsoes.estatisticas())
+
 
 ################################################################################
 # %% constuindo o mapa
@@ -147,8 +158,17 @@ with coluna1:
 
 with coluna2:
 
+    if mostrar_malha:
+        html_tooltip = (
+            '<b>Valor mediano:</b> {median_house_value}<br/>'
+            '<b>Renda mediana:</b> {median_income}<br/>'
+            '<b>Setores:</b> {contagem}'
+        )
+    else:
+        html_tooltip = '<b>Condado:</b> {name}'
+
     tooltip = {
-        'html': '<b>Condado:</b> {name}',
+        'html': html_tooltip,
         'style': {
             'backgroundcolor': 'steelblue',
             'color': 'white',
@@ -156,47 +176,60 @@ with coluna2:
         },
     }
 
-    # colore o estado da califórnia
+    # colore o estado da califórnia e, de cor diferente, o condado selecionado.
+    # as cores são expressões avaliadas no navegador, então o polígono do
+    # condado selecionado não é enviado uma segunda vez
+    selecionado = f'name == {json.dumps(selecionar_condados)}'
     polygon_layer = pdk.Layer(
         type='PolygonLayer',
         data=gdf_geo[['name', 'geometry']],
         get_polygon='geometry',
-        get_fill_color=[0, 0, 255, 100], # RGB + alfa
-        get_line_color=[255, 255, 255],
-        get_line_width=50,
+        get_fill_color=f'{selecionado} ? [255, 0, 0, 100] : [0, 0, 255, 100]', # RGB + alfa
+        get_line_color=f'{selecionado} ? [0, 0, 0] : [255, 255, 255]',
+        get_line_width=f'{selecionado} ? 500 : 50',
         pickable=True, # necessário para funcionar o tooltip
         auto_highlight = True,
     )
 
-    # colore de cor diferente o condado selecionado
+    # sobre a malha, apenas o condado selecionado
     highlight_layer = pdk.Layer(
         type='PolygonLayer',
-        data=df_valores_condado[['name', 'geometry']],
+        data=gdf_geo.loc[gdf_geo['name'] == selecionar_condados, ['name', 'geometry']],
         get_polygon='geometry',
         get_fill_color=[255, 0, 0, 100], # RGB + alfa
         get_line_color=[0, 0, 0],
         get_line_width=500,
-        pickable=True, # necessário para funcionar o tooltip
+        pickable=False, # o tooltip da malha não tem o nome do condado
         auto_highlight = True,
     )
 
+    # valor mediano por hexágono, de azul (mais barato) a vermelho (mais caro)
+    if mostrar_malha:
+        malha_layer = pdk.Layer(
+            type='PolygonLayer',
+            data=carregar_dados_malha(zoom_maximo),
+            get_polygon='geometry',
+            get_fill_color='cor',
+            opacity=0.6,
+            stroked=False,
+            pickable=True, # necessário para funcionar o tooltip
+            auto_highlight = True,
+        )
+
     # localização inicial
     initial_view_state = pdk.ViewState(
         latitude = float(df_valores_condado.loc[0, 'latitude']),
         longitude = float(df_valores_condado.loc[0, 'longitude']),
-        zoom=4,
+        zoom=zoom_inicial,
         min_zoom=3,
-        max_zoom=10,
+        max_zoom=zoom_maximo,
     )
 
     # mapa
     mapa = pdk.Deck(
         initial_view_state=initial_view_state,
         map_style='light',
-        layers=[
-            polygon_layer,
-            highlight_layer,
-        ],
+        layers=[malha_layer, highlight_layer] if mostrar_malha else [polygon_layer],
         tooltip=tooltip,
     )
 
@@ -1,16 +1,16 @@
 import geopandas as gpd
-import numpy as np
-import pandas as pd
 import streamlit as st
 
 from joblib import load
 
-from notebooks.src.config import DADOS_GEO_MEDIAN, DADOS_LIMPOS, MODELO_FINAL
+from notebooks.src.atributos import construir_entrada_modelo
+from notebooks.src.config import DADOS_GEO_MEDIAN, MODELO_FINAL
+from notebooks.src.dados import carregar_dados_limpos as ler_dados_limpos
 
 
 @st.cache_data
 def carregar_dados_limpos():
-    return pd.read_parquet(DADOS_LIMPOS)
+    return ler_dados_limpos(colunas=["ocean_proximity"])
 
 
 @st.cache_data
@@ -42,7 +42,7 @@ households = st.number_input("Domicílios", value=100)
 
 median_income = st.slider("Renda média (múltiplos de US$ 10k)", 0.5, 15.0, 4.5, 0.5)
 
-ocean_proximity = st.selectbox("Proximidade do oceano", df["ocean_proximity"].unique())
+ocean_proximity = st.selectbox("Proximidade do oceano", df["ocean_proximity"].cat.categories)
 
 median_income_cat = st.number_input("Categoria de renda", value=4)
 
@@ -50,23 +50,21 @@ rooms_per_household = st.number_input("Quartos por domicílio", value=7)
 bedrooms_per_room = st.number_input("Quartos por cômodo", value=0.2)
 population_per_household = st.number_input("Pessoas por domicílio", value=2)
 
-entrada_modelo = {
-    "longitude": longitude,
-    "latitude": latitude,
-    "housing_median_age": housing_median_age,
-    "total_rooms": total_rooms,
-    "total_bedrooms": total_bedrooms,
-    "population": population,
-    "households": households,
-    "median_income": median_income,
-    "ocean_proximity": ocean_proximity,
-    "median_income_cat": median_income_cat,
-    "rooms_per_household": rooms_per_household,
-    "bedrooms_per_room": bedrooms_per_room,
-    "population_per_household": population_per_household,
-}
-
-df_entrada_modelo = pd.DataFrame(entrada_modelo, index=[0])
+df_entrada_modelo = construir_entrada_modelo(
+    longitude=longitude,
+    latitude=latitude,
+    housing_median_age=housing_median_age,
+    total_rooms=total_rooms,
+    total_bedrooms=total_bedrooms,
+    population=population,
+    households=households,
+    median_income=median_income,
+    ocean_proximity=ocean_proximity,
+    median_income_cat=median_income_cat,
+    rooms_per_household=rooms_per_household,
+    bedrooms_per_room=bedrooms_per_room,
+    population_per_household=population_per_household,
+)
 
 botao_previsao = st.button("Prever preço")
 
@@ -1,17 +1,11 @@
 import geopandas as gpd
-import numpy as np
-import pandas as pd
 import pydeck as pdk
 import streamlit as st
 
 from joblib import load
 
-from notebooks.src.config import DADOS_GEO_MEDIAN, DADOS_LIMPOS, MODELO_FINAL
-
-
-@st.cache_data
-def carregar_dados_limpos():
-    return pd.read_parquet(DADOS_LIMPOS)
+from notebooks.src.atributos import construir_entrada_modelo, escalar_renda
+from notebooks.src.config import DADOS_GEO_MEDIAN, MODELO_FINAL
 
 
 @st.cache_data
@@ -24,7 +18,6 @@ def carregar_modelo():
     return load(MODELO_FINAL)
 
 
-df = carregar_dados_limpos()
 gdf_geo = carregar_dados_geo()
 modelo = carregar_modelo()
 
@@ -50,34 +43,28 @@ with coluna1:
     
     median_income = st.slider("Renda média (milhares de US$)", 5.0, 100.0, 45.0, 5.0)
     
-    median_income_scale = median_income / 10
+    median_income_scale = escalar_renda(median_income)
     
     ocean_proximity = gdf_geo.query("name == @selecionar_condado")["ocean_proximity"].values
     
-    bins_income = [0, 1.5, 3, 4.5, 6, np.inf]
-    median_income_cat = np.digitize(median_income_scale, bins=bins_income)
-    
     rooms_per_household = gdf_geo.query("name == @selecionar_condado")["rooms_per_household"].values
     bedrooms_per_room = gdf_geo.query("name == @selecionar_condado")["bedrooms_per_room"].values
     population_per_household = gdf_geo.query("name == @selecionar_condado")["population_per_household"].values
     
-    entrada_modelo = {
-        "longitude": longitude,
-        "latitude": latitude,
-        "housing_median_age": housing_median_age,
-        "total_rooms": total_rooms,
-        "total_bedrooms": total_bedrooms,
-        "population": population,
-        "households": households,
-        "median_income": median_income_scale,
-        "ocean_proximity": ocean_proximity,
-        "median_income_cat": median_income_cat,
-        "rooms_per_household": rooms_per_household,
-        "bedrooms_per_room": bedrooms_per_room,
-        "population_per_household": population_per_household,
-    }
-    
-    df_entrada_modelo = pd.DataFrame(entrada_modelo, index=[0])
+    df_entrada_modelo = construir_entrada_modelo(
+        longitude=longitude,
+        latitude=latitude,
+        housing_median_age=housing_median_age,
+        total_rooms=total_rooms,
+        total_bedrooms=total_bedrooms,
+        population=population,
+        households=households,
+        median_income=median_income_scale,
+        ocean_proximity=ocean_proximity,
+        rooms_per_household=rooms_per_household,
+        bedrooms_per_room=bedrooms_per_room,
+        population_per_household=population_per_household,
+    )
     
     botao_previsao = st.button("Prever preço")
     
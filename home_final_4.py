@@ -1,71 +1,48 @@
-import geopandas as gpd
-import numpy as np
-import pandas as pd
+import json
+
 import pydeck as pdk
-import shapely
 import streamlit as st
 
-from joblib import load
-
-from notebooks.src.config import DADOS_GEO_MEDIAN, DADOS_LIMPOS, MODELO_FINAL
+from notebooks.src.atributos import escalar_renda
+from notebooks.src.condados import construir_tabela_condados, entrada_modelo_condado
+from notebooks.src.geometrias import PAYLOAD_MAXIMO_KB, carregar_poligonos
+from notebooks.src.malha import carregar_malha
 
 
 @st.cache_data
-def carregar_dados_limpos():
-    return pd.read_parquet(DADOS_LIMPOS)
+def carregar_dados_geo(zoom):
+    # o pydeck não informa o zoom atual: nível do max_zoom, limitado pelo JSON
+    return carregar_poligonos(zoom=zoom, payload_maximo_kb=PAYLOAD_MAXIMO_KB)
 
 
 @st.cache_data
-def carregar_dados_geo():
-    gdf_geo = gpd.read_parquet(DADOS_GEO_MEDIAN)
-
-    # Explode MultiPolygons into individual polygons
-    gdf_geo = gdf_geo.explode(ignore_index=True)
-
-    # Function to check and fix invalid geometries
-    def fix_and_orient_geometry(geometry):
-        if not geometry.is_valid:
-            geometry = geometry.buffer(0)  # Fix invalid geometry
-        # Orient the polygon to be counter-clockwise if it's a Polygon or MultiPolygon
-        if isinstance(
-            geometry, (shapely.geometry.Polygon, shapely.geometry.MultiPolygon)
-        ):
-            geometry = shapely.geometry.polygon.orient(geometry, sign=1.0)
-        return geometry
-
-    # Apply the fix and orientation function to geometries
-    gdf_geo["geometry"] = gdf_geo["geometry"].apply(fix_and_orient_geometry)
-
-    # Extract polygon coordinates
-    def get_polygon_coordinates(geometry):
-        return (
-            [[[x, y] for x, y in geometry.exterior.coords]]
-            if isinstance(geometry, shapely.geometry.Polygon)
-            else [
-                [[x, y] for x, y in polygon.exterior.coords]
-                for polygon in geometry.geoms
-            ]
-        )
+def carregar_dados_malha(zoom):
+    return carregar_malha(zoom=zoom, payload_maximo_kb=PAYLOAD_MAXIMO_KB)
 
-    # Apply the coordinate conversion and store in a new column
-    gdf_geo["geometry"] = gdf_geo["geometry"].apply(get_polygon_coordinates)
 
-    return gdf_geo
+@st.cache_data
+def carregar_tabela_condados():
+    return construir_tabela_condados()
 
 
 @st.cache_resource
 def carregar_modelo():
-    return load(MODELO_FINAL)
+    # versão ativa do registro, trocada em segundo plano; joblib e sklearn
+    # carregados no primeiro predict, não no import do app
+    from notebooks.src.registro import ModeloAtivo
 
+    return ModeloAtivo().iniciar(aquecer=False)
 
-df = carregar_dados_limpos()
-gdf_geo = carregar_dados_geo()
-modelo = carregar_modelo()
+
+zoom_inicial = 5
+zoom_maximo = 15
+gdf_geo = carregar_dados_geo(zoom_maximo)
+tabela_condados = carregar_tabela_condados()
 
 
 st.title("Previsão de preços de imóveis")
 
-condados = sorted(gdf_geo["name"].unique())
+condados = list(tabela_condados.index)
 
 coluna1, coluna2 = st.columns(2)
 
@@ -75,88 +52,64 @@ with coluna1:
 
         selecionar_condado = st.selectbox("Condado", condados)
 
-        longitude = gdf_geo.query("name == @selecionar_condado")["longitude"].values
-        latitude = gdf_geo.query("name == @selecionar_condado")["latitude"].values
-
         housing_median_age = st.number_input(
             "Idade do imóvel", value=10, min_value=1, max_value=50
         )
 
-        total_rooms = gdf_geo.query("name == @selecionar_condado")["total_rooms"].values
-        total_bedrooms = gdf_geo.query("name == @selecionar_condado")[
-            "total_bedrooms"
-        ].values
-        population = gdf_geo.query("name == @selecionar_condado")["population"].values
-        households = gdf_geo.query("name == @selecionar_condado")["households"].values
-
         median_income = st.slider(
             "Renda média (milhares de US$)", 5.0, 100.0, 45.0, 5.0
         )
 
-        median_income_scale = median_income / 10
-
-        ocean_proximity = gdf_geo.query("name == @selecionar_condado")[
-            "ocean_proximity"
-        ].values
-
-        bins_income = [0, 1.5, 3, 4.5, 6, np.inf]
-        median_income_cat = np.digitize(median_income_scale, bins=bins_income)
-
-        rooms_per_household = gdf_geo.query("name == @selecionar_condado")[
-            "rooms_per_household"
-        ].values
-        bedrooms_per_room = gdf_geo.query("name == @selecionar_condado")[
-            "bedrooms_per_room"
-        ].values
-        population_per_household = gdf_geo.query("name == @selecionar_condado")[
-            "population_per_household"
-        ].values
-
-        entrada_modelo = {
-            "longitude": longitude,
-            "latitude": latitude,
-            "housing_median_age": housing_median_age,
-            "total_rooms": total_rooms,
-            "total_bedrooms": total_bedrooms,
-            "population": population,
-            "households": households,
-            "median_income": median_income_scale,
-            "ocean_proximity": ocean_proximity,
-            "median_income_cat": median_income_cat,
-            "rooms_per_household": rooms_per_household,
-            "bedrooms_per_room": bedrooms_per_room,
-            "population_per_household": population_per_household,
-        }
-
-        df_entrada_modelo = pd.DataFrame(entrada_modelo)
+        median_income_scale = escalar_renda(median_income)
+
+        df_entrada_modelo = entrada_modelo_condado(
+            tabela_condados, selecionar_condado, housing_median_age, median_income_scale
+        )
 
         botao_previsao = st.form_submit_button("Prever preço")
 
+    mostrar_malha = st.toggle("Mostrar malha hexagonal de preços")
+
     if botao_previsao:
-        preco = modelo.predict(df_entrada_modelo)
+        preco = carregar_modelo().predict(df_entrada_modelo)
         st.metric(label="Preço previsto: (US$)", value=f"{preco[0][0]:.2f}")
 
 with coluna2:
 
     view_state = pdk.ViewState(
-        latitude=float(latitude[0]),
-        longitude=float(longitude[0]),
-        zoom=5,
+        latitude=float(df_entrada_modelo["latitude"].iloc[0]),
+        longitude=float(df_entrada_modelo["longitude"].iloc[0]),
+        zoom=zoom_inicial,
         min_zoom=5,
-        max_zoom=15,
+        max_zoom=zoom_maximo,
     )
 
+    # cores avaliadas no navegador: o condado selecionado não é reenviado
+    selecionado = f"name == {json.dumps(selecionar_condado)}"
     polygon_layer = pdk.Layer(
         "PolygonLayer",
         data=gdf_geo[["name", "geometry"]],
         get_polygon="geometry",
-        get_fill_color=[0, 0, 255, 100],
-        get_line_color=[255, 255, 255],
-        get_line_width=50,
+        get_fill_color=f"{selecionado} ? [255, 0, 0, 100] : [0, 0, 255, 100]",
+        get_line_color=f"{selecionado} ? [0, 0, 0] : [255, 255, 255]",
+        get_line_width=f"{selecionado} ? 500 : 50",
         pickable=True,
         auto_highlight=True,
     )
 
+    if mostrar_malha:
+        malha_layer = pdk.Layer(
+            "PolygonLayer",
+            data=carregar_dados_malha(zoom_maximo),
+            get_polygon="geometry",
+            get_fill_color="cor",
+            opacity=0.6,
+            stroked=False,
+            pickable=True,
+            auto_highlight=True,
+        )
+
+    # sobre a malha, apenas o condado selecionado
     condado_selecionado = gdf_geo.query("name == @selecionar_condado")
 
     highlight_layer = pdk.Layer(
@@ -166,19 +119,28 @@ with coluna2:
         get_fill_color=[255, 0, 0, 100],
         get_line_color=[0, 0, 0],
         get_line_width=500,
-        pickable=True,
+        pickable=False,
         auto_highlight=True,
     )
 
+    if mostrar_malha:
+        html_tooltip = (
+            "<b>Valor mediano:</b> {median_house_value}<br/>"
+            "<b>Renda mediana:</b> {median_income}<br/>"
+            "<b>Setores:</b> {contagem}"
+        )
+    else:
+        html_tooltip = "<b>Condado:</b> {name}"
+
     tooltip = {
-        "html": "<b>Condado:</b> {name}",
+        "html": html_tooltip,
         "style": {"backgroundColor": "steelblue", "color": "white", "fontsize": "10px"},
     }
 
     mapa = pdk.Deck(
         initial_view_state=view_state,
         map_style="light",
-        layers=[polygon_layer, highlight_layer],
+        layers=[malha_layer, highlight_layer] if mostrar_malha else [polygon_layer],
         tooltip=tooltip,
     )
 
@@ -5,14 +5,15 @@ import geopandas as gpd # para trabalhar com os dados geográficos
 from joblib import load # para importar o modelo
 
 # import numpy as np
-import pandas as pd
 
 import streamlit as st # interface WEB - https://streamlit.io/
 
+from notebooks.src.atributos import construir_entrada_modelo
+from notebooks.src.dados import carregar_dados_limpos as ler_dados_limpos
+
 # arquivos utilizados
 from notebooks.src.config import(
     DADOS_GEO_MEDIAN,
-    DADOS_LIMPOS,
     MODELO_FINAL
 )
 
@@ -30,7 +31,8 @@ def carregar_dados_geo():
 
 @st.cache_data
 def carregar_dados_limpos():
-    return pd.read_parquet(DADOS_LIMPOS)
+    # apenas a coluna usada nas opções do formulário, já como category
+    return ler_dados_limpos(colunas=['ocean_proximity'])
 
 
 
@@ -71,7 +73,7 @@ households = st.number_input(label='Domicílios', min_value=1, max_value=1979, v
 
 median_income = st.slider(label='Renda média (múltiplos de US$ 10k)', min_value=0.0, max_value=11.0, value=4.5, step=0.5, format='%0.1f')
 
-ocean_proximity = st.selectbox(label='Proximidade do oceano', options=sorted(df['ocean_proximity'].unique()), index=0,)
+ocean_proximity = st.selectbox(label='Proximidade do oceano', options=list(df['ocean_proximity'].cat.categories), index=0,)
 
 median_income_cat = st.number_input(label='Categoria de renda', min_value=1, max_value=5, value=4, format='%d')
 
@@ -86,24 +88,23 @@ botao_previsao = st.button(label='Prever preço')
 # %% construindo a entrada do modelo
 
 if botao_previsao: # True se clicou no botão
-    entrada_modelo = {
-        'longitude': longitude,
-        'latitude': latitude,
-        'housing_median_age': housing_median_age,
-        'total_rooms': total_rooms,
-        'total_bedrooms': total_bedrooms,
-        'population': population,
-        'households': households,
-        'median_income': median_income,
-        'ocean_proximity': ocean_proximity,
-        'median_income_cat': median_income_cat,
-        'rooms_per_household': rooms_per_household,
-        'bedrooms_per_room': bedrooms_per_room,
-        'population_per_household': population_per_household,
-    }
-
-    # df_entrada_modelo = pd.DataFrame(data=[entrada_modelo])
-    df_entrada_modelo = pd.DataFrame(data=entrada_modelo, index=[0])
+    # entrada com as colunas e os tipos do treinamento, montada pelo mesmo
+    # construtor usado pelos demais apps e pela previsão em lote
+    df_entrada_modelo = construir_entrada_modelo(
+        longitude=longitude,
+        latitude=latitude,
+        housing_median_age=housing_median_age,
+        total_rooms=total_rooms,
+        total_bedrooms=total_bedrooms,
+        population=population,
+        households=households,
+        median_income=median_income,
+        ocean_proximity=ocean_proximity,
+        median_income_cat=median_income_cat,
+        rooms_per_household=rooms_per_household,
+        bedrooms_per_room=bedrooms_per_room,
+        population_per_household=population_per_household,
+    )
 
     preco = modelo.predict(df_entrada_modelo) # * 1E3 # faz a predição com os dados da tela
 
@@ -0,0 +1,160 @@
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .config import (
+    DADOS_GEO_ARROW,
+    DADOS_GEO_MEDIAN,
+    DADOS_LIMPOS,
+    DADOS_LIMPOS_ARROW,
+    MODELO_COMPACTO,
+    MODELO_FINAL,
+    MODELO_NPY,
+    PASTA_PROJETO,
+)
+from .modelo_compacto import garantir_modelo_compacto
+
+# cada variante carrega os mesmos dados e modelo; a primeira é o caminho atual
+VARIANTES = ("parquet_joblib", "arrow_npy_mmap")
+
+
+def materializar_tabela(origem, destino):
+    # Arrow IPC (Feather v2) sem compressão: o arquivo tem o mesmo layout da
+    # memória e pode ser mapeado diretamente, sem decodificação
+    tabela = pq.read_table(origem)
+    with pa.OSFile(str(destino), "wb") as arquivo:
+        with pa.ipc.new_file(arquivo, tabela.schema) as escritor:
+            escritor.write_table(tabela)
+    return destino
+
+
+def materializar_modelo(origem=MODELO_COMPACTO, pasta=MODELO_NPY):
+    # um .npy por array do modelo compacto; o .npz não pode ser mapeado
+    garantir_modelo_compacto(origem)
+    pasta.mkdir(parents=True, exist_ok=True)
+    with np.load(origem) as arquivo:
+        for nome in arquivo.files:
+            np.save(pasta / f"{nome}.npy", arquivo[nome])
+    return pasta
+
+
+def materializar_artefatos():
+    caminhos = [
+        materializar_tabela(DADOS_LIMPOS, DADOS_LIMPOS_ARROW),
+        materializar_modelo(),
+    ]
+    if DADOS_GEO_MEDIAN.exists():
+        caminhos.append(materializar_tabela(DADOS_GEO_MEDIAN, DADOS_GEO_ARROW))
+    return caminhos
+
+
+def carregar_tabela_mmap(caminho, colunas=None):
+    # as colunas apontam para as páginas do arquivo, compartilhadas entre os
+    # processos pelo cache de páginas do sistema operacional
+    tabela = pa.ipc.open_file(pa.memory_map(str(caminho), "r")).read_all()
+    if colunas is not None:
+        tabela = tabela.select(colunas)
+    return tabela
+
+
+def carregar_dataframe_mmap(caminho, colunas=None):
+    # colunas numéricas sem nulos viram DataFrame sem cópia; strings e
+    # categorias são convertidas
+    return carregar_tabela_mmap(caminho, colunas).to_pandas(
+        split_blocks=True, self_destruct=True
+    )
+
+
+def carregar_modelo_mmap(pasta=MODELO_NPY):
+    from .modelo_compacto import ModeloCompacto
+
+    return ModeloCompacto(
+        {
+            caminho.stem: np.load(caminho, mmap_mode="r")
+            for caminho in sorted(pasta.glob("*.npy"))
+        }
+    )
+
+
+def _memoria_processo():
+    # RssAnon é memória privada do processo; RssFile são páginas de arquivos,
+    # que ficam no cache do sistema e são compartilhadas entre processos
+    memoria = {}
+    with open("/proc/self/status") as arquivo:
+        for linha in arquivo:
+            chave, _, valor = linha.partition(":")
+            if chave in ("VmRSS", "RssAnon", "RssFile"):
+                memoria[chave] = int(valor.split()[0]) / 1024
+    return memoria
+
+
+def medir_carga(variante):
+    memoria_inicial = _memoria_processo()
+    inicio = time.perf_counter()
+
+    if variante == "parquet_joblib":
+        import pandas as pd
+
+        from joblib import load
+
+        df = pd.read_parquet(DADOS_LIMPOS)
+        modelo = load(MODELO_FINAL)
+    elif variante == "arrow_npy_mmap":
+        df = carregar_dataframe_mmap(DADOS_LIMPOS_ARROW)
+        modelo = carregar_modelo_mmap()
+    else:
+        raise ValueError(f"Variante desconhecida: {variante}")
+
+    colunas = list(modelo.feature_names_in_)
+    modelo.predict(df[colunas].iloc[:1])
+    duracao = time.perf_counter() - inicio
+
+    memoria_final = _memoria_processo()
+    return {
+        "variante": variante,
+        "tempo_s": duracao,
+        **{
+            f"{chave}_mb": memoria_final[chave] - memoria_inicial.get(chave, 0)
+            for chave in memoria_final
+        },
+    }
+
+
+def comparar_inicializacao(variantes=VARIANTES, repeticoes=3):
+    # cada medida em um processo novo, como um worker recém-iniciado
+    import pandas as pd
+
+    resultados = []
+    for variante in variantes:
+        for _ in range(repeticoes):
+            saida = subprocess.run(
+                [sys.executable, "-m", "notebooks.src.artefatos_mmap", "--medir", variante],
+                capture_output=True,
+                text=True,
+                check=True,
+                cwd=PASTA_PROJETO,
+            )
+            resultados.append(json.loads(saida.stdout))
+
+    return pd.DataFrame(resultados).groupby("variante").median()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Artefatos Arrow IPC e .npy mapeáveis em memória."
+    )
+    parser.add_argument("--medir", choices=VARIANTES)
+    args = parser.parse_args()
+
+    if args.medir:
+        print(json.dumps(medir_carga(args.medir)))
+    else:
+        for caminho in materializar_artefatos():
+            print(f"Artefato salvo em {caminho}")
+        print(comparar_inicializacao().round(3).to_string())
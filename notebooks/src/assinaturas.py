@@ -0,0 +1,6 @@
+def assinatura_arquivo(caminho):
+    # tamanho e data de modificação bastam para detectar um novo dump; os
+    # artefatos derivados guardam a assinatura das entradas e são refeitos
+    # quando ela muda
+    estado = caminho.stat()
+    return f"{estado.st_size}-{estado.st_mtime_ns}"
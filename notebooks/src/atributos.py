@@ -0,0 +1,145 @@
+import numpy as np
+import pandas as pd
+
+# mesma ordem das colunas utilizadas no treinamento do modelo
+COLUNAS_MODELO = [
+    "longitude",
+    "latitude",
+    "housing_median_age",
+    "total_rooms",
+    "total_bedrooms",
+    "population",
+    "households",
+    "median_income",
+    "ocean_proximity",
+    "median_income_cat",
+    "rooms_per_household",
+    "population_per_household",
+    "bedrooms_per_room",
+]
+
+# tipos fixos da entrada do modelo, os mesmos que o pipeline recebeu no
+# treinamento (housing_clean.parquet):
+# - colunas float32 no parquet continuam float32, para que os passos que
+#   preservam o tipo (RobustScaler, PolynomialFeatures) façam as mesmas contas;
+# - as contagens e a idade são inteiras no parquet (int8/int16), que o pipeline
+#   converte para float64; aqui já entram em float64, porque os valores dos
+#   condados são medianas e podem ter casa decimal;
+# - as categóricas entram com os valores (os encoders comparam valores, não os
+#   códigos do category do parquet)
+COLUNAS_FLOAT32 = [
+    "longitude",
+    "latitude",
+    "median_income",
+    "rooms_per_household",
+    "population_per_household",
+    "bedrooms_per_room",
+]
+TIPOS_MODELO = {
+    coluna: np.float32 if coluna in COLUNAS_FLOAT32 else np.float64
+    for coluna in COLUNAS_MODELO
+    if coluna not in ("ocean_proximity", "median_income_cat")
+}
+TIPOS_MODELO["ocean_proximity"] = object
+TIPOS_MODELO["median_income_cat"] = np.int64
+
+BINS_RENDA = [0, 1.5, 3, 4.5, 6, np.inf]
+
+# os apps mostram a renda em milhares de US$; o modelo usa dezenas de milhares
+FATOR_RENDA = 10
+
+
+def escalar_renda(renda_milhares):
+    return np.asarray(renda_milhares, dtype=np.float64) / FATOR_RENDA
+
+
+def categorizar_renda(median_income):
+    return np.digitize(median_income, bins=BINS_RENDA)
+
+
+def _coluna(valor, tipo, n_linhas):
+    valor = np.asarray(valor, dtype=tipo)
+    return np.broadcast_to(valor.ravel() if valor.ndim else valor, n_linhas)
+
+
+def construir_entrada_modelo(
+    longitude,
+    latitude,
+    housing_median_age,
+    total_rooms,
+    total_bedrooms,
+    population,
+    households,
+    median_income,
+    ocean_proximity,
+    rooms_per_household,
+    population_per_household,
+    bedrooms_per_room,
+    median_income_cat=None,
+):
+    # cada argumento é um escalar ou um array; escalares são repetidos para
+    # todas as linhas e median_income_cat é calculada quando não informada
+    valores = {
+        "longitude": longitude,
+        "latitude": latitude,
+        "housing_median_age": housing_median_age,
+        "total_rooms": total_rooms,
+        "total_bedrooms": total_bedrooms,
+        "population": population,
+        "households": households,
+        "median_income": median_income,
+        "ocean_proximity": ocean_proximity,
+        "median_income_cat": median_income_cat,
+        "rooms_per_household": rooms_per_household,
+        "population_per_household": population_per_household,
+        "bedrooms_per_room": bedrooms_per_room,
+    }
+    if median_income_cat is None:
+        valores["median_income_cat"] = categorizar_renda(median_income)
+
+    n_linhas = max(np.size(valor) for valor in valores.values())
+
+    return pd.DataFrame(
+        {
+            coluna: _coluna(valores[coluna], TIPOS_MODELO[coluna], n_linhas)
+            for coluna in COLUNAS_MODELO
+        }
+    )
+
+
+def validar_colunas_modelo(entrada, modelo=None):
+    # confere nomes, ordem e tipos da entrada contra o treinamento do modelo
+    colunas = list(entrada.columns)
+    if colunas != COLUNAS_MODELO:
+        raise ValueError(f"Colunas diferentes das do modelo: {colunas}")
+
+    if modelo is not None and colunas != list(modelo.feature_names_in_):
+        raise ValueError(
+            f"Colunas diferentes das do treinamento: {list(modelo.feature_names_in_)}"
+        )
+
+    tipos_errados = [
+        coluna
+        for coluna, tipo in TIPOS_MODELO.items()
+        if entrada[coluna].dtype != np.dtype(tipo)
+    ]
+    if tipos_errados:
+        raise ValueError(f"Colunas com tipo diferente do esperado: {tipos_errados}")
+
+
+if __name__ == "__main__":
+    from joblib import load
+
+    from .config import MODELO_FINAL
+    from .dados import carregar_dados_limpos
+
+    modelo = load(MODELO_FINAL)
+    df = carregar_dados_limpos(COLUNAS_MODELO, otimizar=False)
+
+    entrada = construir_entrada_modelo(**{coluna: df[coluna] for coluna in COLUNAS_MODELO})
+    validar_colunas_modelo(entrada, modelo)
+
+    # os dados limpos têm contagens inteiras e categóricas como category
+    esperado = modelo.predict(df[COLUNAS_MODELO])
+    erro = np.max(np.abs(modelo.predict(entrada) - esperado) / esperado)
+    print(f"Entrada de {len(entrada)} linhas validada (erro relativo máximo: {erro:.2e})")
@@ -0,0 +1,157 @@
+import argparse
+import json
+import platform
+import statistics
+import time
+
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import sklearn
+
+from joblib import load
+
+from .atributos import COLUNAS_MODELO
+from .config import (
+    DADOS_GEO_MEDIAN,
+    DADOS_LIMPOS,
+    MODELO_FINAL,
+    PASTA_BENCHMARKS,
+)
+from .dados import carregar_dados_limpos
+from .geometrias import carregar_poligonos, ler_geometrias, preparar_aneis
+
+TAMANHOS_LOTE = (10, 100, 1_000, 10_000)
+
+# variação relativa do tempo mínimo acima da qual um caso é marcado como regressão.
+# o mínimo é menos sensível a ruído da máquina do que a mediana
+TOLERANCIA_REGRESSAO = 0.10
+
+
+def medir(funcao, repeticoes=5, aquecimento=1):
+    for _ in range(aquecimento):
+        funcao()
+
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+
+    return {
+        "mediana_s": statistics.median(tempos),
+        "minimo_s": min(tempos),
+        "media_s": statistics.mean(tempos),
+        "repeticoes": repeticoes,
+    }
+
+
+def casos_benchmark(tamanhos_lote=TAMANHOS_LOTE):
+    casos = {
+        "ler_dados_limpos": lambda: pd.read_parquet(DADOS_LIMPOS),
+        "ler_dados_limpos_colunas_modelo": lambda: carregar_dados_limpos(COLUNAS_MODELO),
+        "carregar_modelo": lambda: load(MODELO_FINAL),
+    }
+
+    if DADOS_GEO_MEDIAN.exists():
+        import geopandas as gpd
+
+        nomes, geometrias = ler_geometrias(DADOS_GEO_MEDIAN)
+        casos["ler_dados_geo"] = lambda: gpd.read_parquet(DADOS_GEO_MEDIAN)
+        casos["preparar_poligonos"] = lambda: preparar_aneis(nomes, geometrias)
+        casos["carregar_poligonos"] = lambda: carregar_poligonos()
+
+    modelo = load(MODELO_FINAL)
+    X = carregar_dados_limpos(list(modelo.feature_names_in_))
+
+    casos["prever_1_linha"] = lambda: modelo.predict(X.iloc[:1])
+
+    for tamanho in tamanhos_lote:
+        # repete as linhas quando o lote é maior que o conjunto de dados
+        X_lote = X.iloc[np.arange(tamanho) % len(X)]
+        casos[f"prever_lote_{tamanho}"] = lambda X_lote=X_lote: modelo.predict(X_lote)
+
+    return casos
+
+
+def executar_benchmarks(repeticoes=5, tamanhos_lote=TAMANHOS_LOTE):
+    resultados = {
+        nome: medir(funcao, repeticoes)
+        for nome, funcao in casos_benchmark(tamanhos_lote).items()
+    }
+
+    return {
+        "metadados": {
+            "data": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "plataforma": platform.platform(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "scikit-learn": sklearn.__version__,
+            "modelo": MODELO_FINAL.name,
+        },
+        "resultados": resultados,
+    }
+
+
+def salvar_benchmark(benchmark, pasta=PASTA_BENCHMARKS):
+    pasta.mkdir(parents=True, exist_ok=True)
+    data = benchmark["metadados"]["data"].replace(":", "").replace("-", "")
+    caminho = pasta / f"benchmark_{data}.json"
+    caminho.write_text(json.dumps(benchmark, indent=2, ensure_ascii=False))
+    return caminho
+
+
+def ultimo_benchmark(pasta=PASTA_BENCHMARKS, ignorar=None):
+    arquivos = sorted(p for p in pasta.glob("benchmark_*.json") if p != ignorar)
+    return arquivos[-1] if arquivos else None
+
+
+def comparar_benchmarks(atual, anterior, tolerancia=TOLERANCIA_REGRESSAO):
+    if not isinstance(anterior, dict):
+        anterior = json.loads(anterior.read_text())
+
+    df_comparacao = pd.DataFrame(
+        {
+            "anterior_s": {
+                nome: resultado["minimo_s"]
+                for nome, resultado in anterior["resultados"].items()
+            },
+            "atual_s": {
+                nome: resultado["minimo_s"]
+                for nome, resultado in atual["resultados"].items()
+            },
+        }
+    )
+
+    df_comparacao["variacao"] = df_comparacao["atual_s"] / df_comparacao["anterior_s"] - 1
+    df_comparacao["regressao"] = df_comparacao["variacao"] > tolerancia
+
+    return df_comparacao
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmarks de carregamento de dados e inferência."
+    )
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument(
+        "--comparar",
+        help="JSON de uma execução anterior (padrão: a mais recente em relatorios/benchmarks)",
+    )
+    parser.add_argument("--tolerancia", type=float, default=TOLERANCIA_REGRESSAO)
+    args = parser.parse_args()
+
+    benchmark = executar_benchmarks(args.repeticoes)
+    caminho = salvar_benchmark(benchmark)
+    print(f"Resultados salvos em {caminho}")
+
+    anterior = args.comparar or ultimo_benchmark(ignorar=caminho)
+    if anterior is None:
+        print(pd.DataFrame(benchmark["resultados"]).T.to_string())
+    else:
+        df_comparacao = comparar_benchmarks(benchmark, Path(anterior), args.tolerancia)
+        print(f"Comparação com {anterior}")
+        print(df_comparacao.to_string())
@@ -0,0 +1,192 @@
+import os
+import time
+
+from pathlib import Path
+
+import pandas as pd
+
+from joblib import Memory
+from joblib.disk import memstr_to_bytes
+
+from .config import PASTA_CACHE_PIPELINE
+
+LIMITE_CACHE = "2G"
+ARQUIVO_ESTATISTICAS = "estatisticas.tsv"
+
+# o registro de acertos é podado para a metade deste tamanho quando passa dele;
+# ele conta no limite da pasta do cache
+LIMITE_ESTATISTICAS = 1024**2
+
+
+def _usa_alvo(estimador):
+    # passos supervisionados (TargetEncoder, SelectKBest...) declaram nas tags
+    # que exigem o y; vale também para os passos dentro de um ColumnTransformer
+    # ou Pipeline
+    from sklearn.utils import get_tags
+
+    estimadores = [estimador] + [
+        valor
+        for valor in estimador.get_params(deep=True).values()
+        if hasattr(valor, "fit") and not isinstance(valor, type)
+    ]
+    return any(get_tags(e).target_tags.required for e in estimadores)
+
+
+class _FuncaoContada:
+    # registra, para cada chamada da função em cache, se o resultado já estava
+    # guardado. O registro vai para um arquivo na pasta do cache porque as
+    # buscas rodam em outros processos (n_jobs=-1).
+    # Com `funcao_sem_alvo` (a mesma função em cache sem o y na chave), ela é
+    # usada para os passos que não usam o alvo
+
+    def __init__(self, funcao, arquivo_estatisticas, funcao_sem_alvo=None):
+        self.funcao = funcao
+        self.arquivo_estatisticas = arquivo_estatisticas
+        self.funcao_sem_alvo = funcao_sem_alvo
+
+    def __call__(self, *args, **kwargs):
+        funcao = self.funcao
+        # args[0] é o transformador do passo (_fit_transform_one do Pipeline)
+        if self.funcao_sem_alvo is not None and args and not _usa_alvo(args[0]):
+            funcao = self.funcao_sem_alvo
+
+        acerto = funcao.check_call_in_cache(*args, **kwargs)
+
+        inicio = time.perf_counter()
+        resultado = funcao(*args, **kwargs)
+        duracao = time.perf_counter() - inicio
+
+        nome = type(args[0]).__name__ if args else self.funcao.func.__name__
+        with open(self.arquivo_estatisticas, "a") as arquivo:
+            arquivo.write(f"{time.time()}\t{os.getpid()}\t{nome}\t{int(acerto)}\t{duracao}\n")
+
+        return resultado
+
+
+# joblib.Memory para o `memory=` do Pipeline, com tamanho limitado em disco:
+# os passos ajustados ficam guardados pelo hash dos parâmetros do passo e dos
+# dados do fold, e as entradas usadas há mais tempo são removidas quando a
+# pasta (cache e registro de acertos) passa de `limite_bytes`. Com
+# ignorar_alvo=True o y fica fora da chave dos passos que não o usam: os
+# pré-processamentos deste projeto (encoders, RobustScaler, polinômio) não usam
+# o alvo, e com o TransformedTargetRegressor o y transformado muda a cada
+# ajuste quando o QuantileTransformer subamostra sem random_state. Passos
+# supervisionados (pelas tags do sklearn) continuam com o y na chave
+class MemoriaLimitada(Memory):
+
+    def __init__(
+        self,
+        location=PASTA_CACHE_PIPELINE,
+        limite_bytes=LIMITE_CACHE,
+        ignorar_alvo=True,
+        mmap_mode="r",
+        verbose=0,
+    ):
+        Path(location).mkdir(parents=True, exist_ok=True)
+        super().__init__(location, mmap_mode=mmap_mode, verbose=verbose)
+        self.limite_bytes = limite_bytes
+        self.ignorar_alvo = ignorar_alvo
+        self.limitar()
+
+    @property
+    def arquivo_estatisticas(self):
+        return Path(self.location) / ARQUIVO_ESTATISTICAS
+
+    def cache(self, func=None, ignore=None, **kwargs):
+        if func is None:
+            return lambda f: self.cache(f, ignore=ignore, **kwargs)
+
+        funcao_sem_alvo = None
+        if self.ignorar_alvo and func.__name__ == "_fit_transform_one":
+            funcao_sem_alvo = super().cache(
+                func, ignore=[*(ignore or []), "y"], **kwargs
+            )
+        return _FuncaoContada(
+            super().cache(func, ignore=ignore, **kwargs),
+            self.arquivo_estatisticas,
+            funcao_sem_alvo,
+        )
+
+    def _podar_estatisticas(self):
+        # mantém as linhas mais recentes do registro de acertos
+        arquivo = self.arquivo_estatisticas
+        if not arquivo.exists() or arquivo.stat().st_size <= LIMITE_ESTATISTICAS:
+            return
+
+        linhas = arquivo.read_bytes().splitlines(keepends=True)
+        mantidas, tamanho = [], 0
+        for linha in reversed(linhas):
+            tamanho += len(linha)
+            if tamanho > LIMITE_ESTATISTICAS // 2:
+                break
+            mantidas.append(linha)
+
+        temporario = arquivo.with_name(f".{arquivo.name}.tmp")
+        temporario.write_bytes(b"".join(reversed(mantidas)))
+        os.replace(temporario, arquivo)
+
+    def limitar(self):
+        # feito no processo principal, nunca durante uma busca: remover entradas
+        # enquanto outro processo as lê quebraria o carregamento
+        self._podar_estatisticas()
+
+        limite = self.limite_bytes
+        if isinstance(limite, str):
+            limite = memstr_to_bytes(limite)
+        estatisticas = self.arquivo_estatisticas
+        tamanho_estatisticas = estatisticas.stat().st_size if estatisticas.exists() else 0
+        self.reduce_size(bytes_limit=max(limite - tamanho_estatisticas, 0))
+
+    def tamanho_bytes(self):
+        return sum(
+            arquivo.stat().st_size
+            for arquivo in Path(self.location).rglob("*")
+            if arquivo.is_file()
+        )
+
+
+def criar_memoria(memoria):
+    # aceita o mesmo que o `memory=` do Pipeline: None, uma pasta ou um objeto
+    # com a interface do joblib.Memory; True usa a pasta padrão do projeto
+    if memoria is None or memoria is False:
+        return None
+    if memoria is True:
+        return MemoriaLimitada()
+    if isinstance(memoria, (str, Path)):
+        return MemoriaLimitada(memoria)
+    return memoria
+
+
+def relatorio_cache(memoria, desde=None):
+    # acertos e falhas por passo desde `desde` (time.time() do início da busca)
+    memoria = criar_memoria(memoria)
+    if not isinstance(memoria, MemoriaLimitada):
+        raise ValueError(
+            "relatorio_cache precisa de uma MemoriaLimitada (ou True, ou uma "
+            f"pasta), recebeu {memoria!r}"
+        )
+
+    colunas = ["momento", "pid", "passo", "acerto", "duracao_s"]
+    if memoria.arquivo_estatisticas.exists():
+        df_chamadas = pd.read_csv(memoria.arquivo_estatisticas, sep="\t", names=colunas)
+    else:
+        df_chamadas = pd.DataFrame(columns=colunas)
+    # a poda do registro vem depois da leitura, para não perder a busca atual
+    memoria.limitar()
+    if desde is not None:
+        df_chamadas = df_chamadas[df_chamadas["momento"] >= desde]
+
+    df_relatorio = df_chamadas.groupby("passo").agg(
+        chamadas=("acerto", "size"),
+        acertos=("acerto", "sum"),
+        tempo_s=("duracao_s", "sum"),
+        tempo_acertos_s=(
+            "duracao_s",
+            lambda duracao: duracao[df_chamadas.loc[duracao.index, "acerto"] == 1].sum(),
+        ),
+    )
+    df_relatorio["falhas"] = df_relatorio["chamadas"] - df_relatorio["acertos"]
+    df_relatorio["taxa_acerto"] = df_relatorio["acertos"] / df_relatorio["chamadas"]
+    df_relatorio.attrs["tamanho_mb"] = memoria.tamanho_bytes() / 1024**2
+
+    return df_relatorio
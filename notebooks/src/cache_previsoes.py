@@ -0,0 +1,80 @@
+import threading
+
+from collections import OrderedDict
+
+from .atributos import categorizar_renda
+
+TAMANHO_CACHE = 4_096
+
+
+# LRU de preços de um único modelo carregado. A troca de modelo não é
+# detectada aqui: quem carrega o modelo cria um cache novo junto com ele
+# (ModeloAtivo em registro.py, com a superfície de previsões), já que limpar
+# o cache sem recarregar o modelo só o encheria de novo com os preços antigos
+class CachePrevisoes:
+
+    def __init__(self, tamanho_maximo=TAMANHO_CACHE):
+        self.tamanho_maximo = tamanho_maximo
+        self._trava = threading.Lock()
+        self._previsoes = OrderedDict()
+        # incrementada a cada limpeza; previsões calculadas antes dela não
+        # são guardadas
+        self._geracao = 0
+        self.acertos = 0
+        self.falhas = 0
+        self.invalidacoes = 0
+
+    @staticmethod
+    def chave(condado, housing_median_age, median_income):
+        # entrada normalizada do modelo: renda já dividida por 10 e sua faixa.
+        # idade e renda são arredondadas do mesmo jeito, sem truncar: 10.7 e
+        # 10.2 chegam diferentes ao modelo e não podem dividir a chave
+        median_income = round(float(median_income), 6)
+        return (
+            str(condado),
+            round(float(housing_median_age), 6),
+            median_income,
+            int(categorizar_renda(median_income)),
+        )
+
+    def prever(self, condado, housing_median_age, median_income, funcao_previsao):
+        chave = self.chave(condado, housing_median_age, median_income)
+
+        with self._trava:
+            if chave in self._previsoes:
+                self._previsoes.move_to_end(chave)
+                self.acertos += 1
+                return self._previsoes[chave]
+            self.falhas += 1
+            geracao = self._geracao
+
+        # o modelo roda fora da trava para não bloquear outras sessões
+        preco = funcao_previsao(condado, housing_median_age, median_income)
+
+        with self._trava:
+            if geracao != self._geracao:
+                return preco
+            self._previsoes[chave] = preco
+            self._previsoes.move_to_end(chave)
+            while len(self._previsoes) > self.tamanho_maximo:
+                self._previsoes.popitem(last=False)
+
+        return preco
+
+    def limpar(self):
+        with self._trava:
+            self._previsoes.clear()
+            self._geracao += 1
+            self.invalidacoes += 1
+
+    def estatisticas(self):
+        with self._trava:
+            consultas = self.acertos + self.falhas
+            return {
+                "acertos": self.acertos,
+                "falhas": self.falhas,
+                "taxa_acerto": self.acertos / consultas if consultas else 0.0,
+                "invalidacoes": self.invalidacoes,
+                "tamanho": len(self._previsoes),
+                "tamanho_maximo": self.tamanho_maximo,
+            }
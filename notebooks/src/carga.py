@@ -0,0 +1,126 @@
+import argparse
+import json
+import threading
+import time
+import urllib.request
+
+import numpy as np
+
+from .atributos import escalar_renda
+from .condados import construir_tabela_condados
+from .servidor import HOST, PORTA
+
+
+def gerar_registros(condados, tamanho, rng):
+    # mesmo espaço de entrada do formulário dos apps
+    return [
+        {
+            "name": str(condado),
+            "housing_median_age": int(idade),
+            "median_income": float(escalar_renda(renda)),
+        }
+        for condado, idade, renda in zip(
+            rng.choice(condados, tamanho),
+            rng.integers(1, 51, tamanho),
+            rng.integers(1, 21, tamanho) * 5,
+        )
+    ]
+
+
+def _requisitar(url, dados=None):
+    requisicao = urllib.request.Request(
+        url, data=dados, headers={"Content-Type": "application/json"}
+    )
+    with urllib.request.urlopen(requisicao) as resposta:
+        return json.loads(resposta.read())
+
+
+def _percentis(latencias_ms):
+    if not len(latencias_ms):
+        return None, None
+    p50, p99 = np.percentile(latencias_ms, [50, 99])
+    return float(p50), float(p99)
+
+
+def executar_carga(
+    url=f"http://{HOST}:{PORTA}",
+    concorrencia=8,
+    requisicoes=2_000,
+    tamanho_lote=1,
+    condados=None,
+    random_state=42,
+):
+    if condados is None:
+        condados = construir_tabela_condados().index.to_numpy()
+
+    rng = np.random.default_rng(random_state)
+    corpos = [
+        json.dumps(gerar_registros(condados, tamanho_lote, rng)).encode()
+        for _ in range(requisicoes)
+    ]
+
+    latencias = np.zeros(requisicoes)
+    sucessos = np.zeros(requisicoes, dtype=bool)
+    proxima = iter(range(requisicoes))
+    trava = threading.Lock()
+
+    def trabalhador():
+        while True:
+            with trava:
+                indice = next(proxima, None)
+            if indice is None:
+                return
+
+            inicio = time.perf_counter()
+            try:
+                _requisitar(f"{url}/prever", corpos[indice])
+                sucessos[indice] = True
+            except OSError:
+                pass
+            latencias[indice] = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    threads = [threading.Thread(target=trabalhador) for _ in range(concorrencia)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duracao = time.perf_counter() - inicio
+
+    # falhas costumam responder muito mais rápido (ou muito mais devagar, por
+    # timeout) que as previsões, então ficam fora dos percentis e da vazão
+    latencias_ms = latencias * 1000
+    p50, p99 = _percentis(latencias_ms[sucessos])
+    p50_falhas, p99_falhas = _percentis(latencias_ms[~sucessos])
+    n_sucessos = int(sucessos.sum())
+
+    return {
+        "concorrencia": concorrencia,
+        "tamanho_lote": tamanho_lote,
+        "requisicoes": requisicoes,
+        "sucessos": n_sucessos,
+        "falhas": requisicoes - n_sucessos,
+        "p50_ms": p50,
+        "p99_ms": p99,
+        "p50_falhas_ms": p50_falhas,
+        "p99_falhas_ms": p99_falhas,
+        "requisicoes_por_segundo": n_sucessos / duracao,
+        "linhas_por_segundo": n_sucessos * tamanho_lote / duracao,
+        "servidor": _requisitar(f"{url}/metricas"),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Gerador de carga para o servidor de previsão local."
+    )
+    parser.add_argument("--url", default=f"http://{HOST}:{PORTA}")
+    parser.add_argument("--concorrencia", type=int, default=8)
+    parser.add_argument("--requisicoes", type=int, default=2_000)
+    parser.add_argument("--tamanho-lote", type=int, default=1)
+    args = parser.parse_args()
+
+    resultado = executar_carga(
+        args.url, args.concorrencia, args.requisicoes, args.tamanho_lote
+    )
+    print(json.dumps(resultado, indent=2, ensure_ascii=False))
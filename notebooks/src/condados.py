@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+
+from .atributos import construir_entrada_modelo
+from .config import DADOS_GEO_MEDIAN
+
+# colunas que vêm da mediana do condado; as demais são informadas pelo usuário
+COLUNAS_CONDADO = [
+    "longitude",
+    "latitude",
+    "total_rooms",
+    "total_bedrooms",
+    "population",
+    "households",
+    "ocean_proximity",
+    "rooms_per_household",
+    "population_per_household",
+    "bedrooms_per_room",
+]
+
+
+def _primeira_moda(valor):
+    # agg(pd.Series.mode) devolve um array quando há empate entre categorias
+    return valor if np.ndim(valor) == 0 else valor[0]
+
+
+def construir_tabela_condados(caminho=DADOS_GEO_MEDIAN):
+    # lê apenas as colunas tabulares, sem decodificar as geometrias
+    df = pd.read_parquet(caminho, columns=["name"] + COLUNAS_CONDADO)
+
+    df["ocean_proximity"] = df["ocean_proximity"].map(_primeira_moda).astype(str)
+
+    return df.drop_duplicates(subset="name").set_index("name").sort_index()
+
+
+def entradas_modelo_condados(tabela, condados, housing_median_age, median_income):
+    condados = np.atleast_1d(condados)
+    posicoes = tabela.index.get_indexer(condados)
+    if (posicoes == -1).any():
+        faltantes = sorted(set(map(str, condados[posicoes == -1])))
+        raise KeyError(f"Condados não encontrados: {faltantes}")
+
+    linhas = tabela.iloc[posicoes]
+
+    return construir_entrada_modelo(
+        **{coluna: linhas[coluna].to_numpy() for coluna in COLUNAS_CONDADO},
+        housing_median_age=housing_median_age,
+        median_income=median_income,
+    )
+
+
+def entrada_modelo_condado(tabela, condado, housing_median_age, median_income):
+    return entradas_modelo_condados(
+        tabela, [condado], housing_median_age, median_income
+    )
@@ -3,18 +3,31 @@ from pathlib import Path
 
 PASTA_PROJETO = Path(__file__).resolve().parents[2]
 
+RANDOM_STATE = 42
+
 PASTA_DADOS = PASTA_PROJETO / "dados"
 
 # coloque abaixo o caminho para os arquivos de dados de seu projeto
 DADOS_ORIGINAIS = PASTA_DADOS / "housing.csv.zip"
 DADOS_LIMPOS = PASTA_DADOS / "housing_clean.parquet"
+DADOS_LIMPOS_ARROW = PASTA_DADOS / "housing_clean.arrow"
 DADOS_GEO_ORIGINAIS = PASTA_DADOS / "california_counties.geojson"
 DADOS_GEO_MEDIAN = PASTA_DADOS / "gdf_counties.parquet"
+DADOS_GEO_ARROW = PASTA_DADOS / "gdf_counties.arrow"
+POLIGONOS_MAPA = PASTA_DADOS / "poligonos_condados.npz"
+MALHA_HEXAGONAL = PASTA_DADOS / "malha_hexagonal.parquet"
+SUPERFICIE_PREVISOES = PASTA_DADOS / "superficie_previsoes.npz"
 
 # coloque abaixo o caminho para os arquivos de modelos de seu projeto
 PASTA_MODELOS = PASTA_PROJETO / "modelos"
 MODELO_FINAL = PASTA_MODELOS / "ridge_polyfeat_target_quantile.joblib"
+MODELO_COMPACTO = PASTA_MODELOS / "ridge_polyfeat_target_quantile.npz"
+MODELO_NPY = PASTA_MODELOS / "ridge_polyfeat_target_quantile_npy"
+PASTA_MODELOS_INCREMENTAIS = PASTA_MODELOS / "incremental"
+PASTA_REGISTRO = PASTA_MODELOS / "registro"
 
 # coloque abaixo outros caminhos que você julgar necessário
 PASTA_RELATORIOS = PASTA_PROJETO / "relatorios"
 PASTA_IMAGENS = PASTA_RELATORIOS / "imagens"
+PASTA_BENCHMARKS = PASTA_RELATORIOS / "benchmarks"
+PASTA_CACHE_PIPELINE = PASTA_PROJETO / "cache" / "pipeline"
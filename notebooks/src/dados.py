@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from .config import DADOS_LIMPOS
+
+COLUNAS_CATEGORICAS = ["ocean_proximity", "median_income_cat"]
+
+TIPOS_INTEIROS = (pa.int8(), pa.int16(), pa.int32(), pa.int64())
+
+
+def _menor_inteiro(coluna):
+    extremos = pc.min_max(coluna)
+    minimo, maximo = extremos["min"].as_py(), extremos["max"].as_py()
+    for tipo in TIPOS_INTEIROS:
+        limites = np.iinfo(tipo.to_pandas_dtype())
+        if limites.min <= minimo and maximo <= limites.max:
+            return tipo
+    return coluna.type
+
+
+def otimizar_tipos(tabela):
+    # conversões feitas ainda na tabela do pyarrow, antes de virar DataFrame:
+    # float64 -> float32, inteiros no menor tipo com sinal que comporta os
+    # valores e as colunas categóricas como dicionário (category no pandas)
+    for i, campo in enumerate(tabela.schema):
+        coluna = tabela.column(i)
+        if campo.name in COLUNAS_CATEGORICAS:
+            if not pa.types.is_dictionary(campo.type):
+                coluna = coluna.dictionary_encode()
+        elif pa.types.is_float64(campo.type):
+            coluna = coluna.cast(pa.float32())
+        elif pa.types.is_integer(campo.type) and coluna.null_count < len(coluna):
+            coluna = coluna.cast(_menor_inteiro(coluna))
+        tabela = tabela.set_column(i, campo.name, coluna)
+    return tabela
+
+
+def carregar_dados_limpos(
+    colunas=None, filtros=None, otimizar=True, caminho=DADOS_LIMPOS
+):
+    # colunas e filtros vão direto para o leitor de parquet do pyarrow: apenas as
+    # colunas pedidas são decodificadas e os filtros são aplicados na leitura,
+    # sem carregar o arquivo inteiro. Ex.: filtros=[("median_income_cat", ">=", 4)]
+    if not otimizar:
+        return pd.read_parquet(caminho, columns=colunas, filters=filtros)
+
+    tabela = pq.read_table(caminho, columns=colunas, filters=filtros)
+    df = otimizar_tipos(tabela).to_pandas()
+
+    # o dicionário do pyarrow segue a ordem de aparição; as categorias ficam
+    # ordenadas como no astype("category") do pandas
+    for coluna in df.columns.intersection(COLUNAS_CATEGORICAS):
+        categorias = df[coluna].cat.categories
+        if not categorias.is_monotonic_increasing:
+            df[coluna] = df[coluna].cat.reorder_categories(categorias.sort_values())
+
+    return df
+
+
+def relatorio_memoria(colunas=None, filtros=None, caminho=DADOS_LIMPOS):
+    # memória por coluna da leitura completa padrão contra a leitura otimizada
+    padrao = pd.read_parquet(caminho).memory_usage(deep=True, index=False)
+    otimizado = carregar_dados_limpos(colunas, filtros, caminho=caminho).memory_usage(
+        deep=True, index=False
+    )
+    otimizado = otimizado.reindex(padrao.index, fill_value=0)
+
+    df_memoria = pd.DataFrame({"padrao_kb": padrao, "otimizado_kb": otimizado}) / 1024
+    df_memoria.loc["total"] = df_memoria.sum()
+    df_memoria["economia_kb"] = df_memoria["padrao_kb"] - df_memoria["otimizado_kb"]
+    df_memoria["economia"] = df_memoria["economia_kb"] / df_memoria["padrao_kb"]
+
+    return df_memoria
+
+
+if __name__ == "__main__":
+    print(relatorio_memoria().round(2).to_string())
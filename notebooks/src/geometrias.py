@@ -0,0 +1,191 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+from .assinaturas import assinatura_arquivo
+from .config import DADOS_GEO_MEDIAN, POLIGONOS_MAPA
+
+# em graus; 0.001 grau equivale a cerca de 100 m na latitude da Califórnia
+TOLERANCIA_SIMPLIFICACAO = 0.001
+CASAS_DECIMAIS = 5
+
+# zoom mínimo do ViewState -> tolerância de simplificação (0 = resolução total).
+# cada nível usa cerca de meio pixel de tolerância no menor zoom em que é servido
+NIVEIS_DETALHE = {
+    0: 0.02,
+    6: 0.005,
+    8: TOLERANCIA_SIMPLIFICACAO,
+    10: 0,
+}
+
+# limite do JSON de uma camada; acima dele o app recebe um nível mais grosso.
+# o pydeck não devolve o zoom atual ao Python, então o nível é escolhido pelo
+# max_zoom do mapa e limitado por este tamanho
+PAYLOAD_MAXIMO_KB = 1024
+
+# versão do formato do .npz; caches gravados em outro formato são refeitos
+FORMATO_POLIGONOS = 3
+
+
+def ler_geometrias(caminho=DADOS_GEO_MEDIAN):
+    # o shapely só é importado para gerar o cache; os apps leem apenas o .npz
+    import shapely
+
+    # o GeoParquet guarda as geometrias em WKB, decodificadas de uma vez pelo shapely
+    df = pd.read_parquet(caminho, columns=["name", "geometry"])
+    return df["name"].to_numpy(), shapely.from_wkb(df["geometry"].to_numpy())
+
+
+def preparar_aneis(nomes, geometrias, tolerancia=TOLERANCIA_SIMPLIFICACAO):
+    import shapely
+
+    geometrias = np.array(geometrias, dtype=object)
+
+    invalidas = ~shapely.is_valid(geometrias)
+    geometrias[invalidas] = shapely.buffer(geometrias[invalidas], 0)
+
+    # equivalente ao explode: cada parte de um MultiPolygon vira um polígono
+    partes, indice_geometria = shapely.get_parts(geometrias, return_index=True)
+    poligonos = shapely.get_type_id(partes) == shapely.GeometryType.POLYGON
+    partes = partes[poligonos]
+    indice_geometria = indice_geometria[poligonos]
+
+    if tolerancia:
+        partes = shapely.simplify(partes, tolerancia, preserve_topology=True)
+
+    nao_vazias = ~shapely.is_empty(partes)
+    partes = partes[nao_vazias]
+    indice_geometria = indice_geometria[nao_vazias]
+
+    # o pydeck espera o anel externo no sentido anti-horário
+    aneis = shapely.get_exterior_ring(partes)
+    horarios = ~shapely.is_ccw(aneis)
+    aneis[horarios] = shapely.reverse(aneis[horarios])
+
+    coordenadas, indice_anel = shapely.get_coordinates(aneis, return_index=True)
+    offsets = np.zeros(len(aneis) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(np.bincount(indice_anel, minlength=len(aneis)))
+
+    return nomes[indice_geometria], coordenadas.astype(np.float32), offsets
+
+
+def construir_cache_poligonos(
+    caminho_geo=DADOS_GEO_MEDIAN,
+    caminho_saida=POLIGONOS_MAPA,
+    niveis=NIVEIS_DETALHE,
+):
+    nomes, geometrias = ler_geometrias(caminho_geo)
+
+    arrays = {
+        "formato": np.array(FORMATO_POLIGONOS),
+        "assinatura_geo": np.array(assinatura_arquivo(caminho_geo)),
+        "zooms": np.array(sorted(niveis), dtype=np.int64),
+    }
+    for zoom in sorted(niveis):
+        nomes_nivel, coordenadas, offsets = preparar_aneis(
+            nomes, geometrias, niveis[zoom]
+        )
+        arrays[f"nomes_{zoom}"] = nomes_nivel.astype(str)
+        arrays[f"coordenadas_{zoom}"] = coordenadas
+        arrays[f"offsets_{zoom}"] = offsets
+
+    np.savez(caminho_saida, **arrays)
+
+    return caminho_saida
+
+
+def escolher_nivel(zooms, zoom):
+    # maior nível cujo zoom mínimo não ultrapassa o zoom pedido
+    return zooms[max(np.searchsorted(zooms, zoom, side="right") - 1, 0)]
+
+
+def payload_kb(df):
+    # tamanho aproximado do JSON enviado ao navegador pela camada
+    return len(json.dumps(df.to_dict(orient="records")).encode()) / 1024
+
+
+def servir_nivel(zooms, zoom, carregar_nivel, payload_maximo_kb=None):
+    # do nível do zoom pedido para os mais grossos, o primeiro cujo JSON cabe
+    # no limite; o mais grosso é servido mesmo que não caiba
+    zooms = np.sort(np.asarray(zooms))
+    candidatos = zooms[: np.searchsorted(zooms, escolher_nivel(zooms, zoom)) + 1]
+    for nivel in candidatos[::-1]:
+        df = carregar_nivel(nivel)
+        if payload_maximo_kb is None or nivel == candidatos[0]:
+            return df
+        if payload_kb(df) <= payload_maximo_kb:
+            return df
+
+
+def poligonos_pydeck(nomes, coordenadas, offsets):
+    # uma única conversão para lista; cada polígono é uma fatia dela. O
+    # arredondamento (~1 m) evita que o float32 vire números longos no JSON
+    pontos = np.round(coordenadas.astype(np.float64), CASAS_DECIMAIS).tolist()
+    poligonos = [[pontos[inicio:fim]] for inicio, fim in zip(offsets[:-1], offsets[1:])]
+    return pd.DataFrame({"name": nomes, "geometry": poligonos})
+
+
+def garantir_cache_poligonos(caminho=POLIGONOS_MAPA, caminho_geo=DADOS_GEO_MEDIAN):
+    # refaz o cache se ele não existe, foi gravado em outro formato (o .npz
+    # de nível único, sem "zooms", não tem a chave "formato") ou a partir de
+    # outra versão de DADOS_GEO_MEDIAN
+    if caminho.exists():
+        with np.load(caminho) as arquivo:
+            if (
+                "formato" in arquivo
+                and int(arquivo["formato"]) == FORMATO_POLIGONOS
+                and str(arquivo["assinatura_geo"]) == assinatura_arquivo(caminho_geo)
+            ):
+                return caminho
+    return construir_cache_poligonos(caminho_geo, caminho)
+
+
+def carregar_poligonos(
+    zoom=0,
+    payload_maximo_kb=None,
+    caminho=POLIGONOS_MAPA,
+    caminho_geo=DADOS_GEO_MEDIAN,
+):
+    garantir_cache_poligonos(caminho, caminho_geo)
+
+    with np.load(caminho) as arquivo:
+        return servir_nivel(
+            arquivo["zooms"],
+            zoom,
+            lambda nivel: poligonos_pydeck(
+                arquivo[f"nomes_{nivel}"],
+                arquivo[f"coordenadas_{nivel}"],
+                arquivo[f"offsets_{nivel}"],
+            ),
+            payload_maximo_kb,
+        )
+
+
+def relatorio_niveis_detalhe(caminho=POLIGONOS_MAPA, caminho_geo=DADOS_GEO_MEDIAN):
+    garantir_cache_poligonos(caminho, caminho_geo)
+
+    linhas = []
+    with np.load(caminho) as arquivo:
+        for zoom in arquivo["zooms"]:
+            df_poligonos = poligonos_pydeck(
+                arquivo[f"nomes_{zoom}"],
+                arquivo[f"coordenadas_{zoom}"],
+                arquivo[f"offsets_{zoom}"],
+            )
+            linhas.append(
+                {
+                    "zoom_minimo": int(zoom),
+                    "tolerancia": NIVEIS_DETALHE.get(int(zoom)),
+                    "poligonos": len(df_poligonos),
+                    "vertices": len(arquivo[f"coordenadas_{zoom}"]),
+                    "payload_kb": payload_kb(df_poligonos),
+                }
+            )
+
+    return pd.DataFrame(linhas)
+
+
+if __name__ == "__main__":
+    print(f"Cache de polígonos salvo em {construir_cache_poligonos()}")
+    print(relatorio_niveis_detalhe().to_string(index=False))
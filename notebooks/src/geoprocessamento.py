@@ -0,0 +1,108 @@
+import warnings
+
+import geopandas as gpd
+import pandas as pd
+
+from .config import DADOS_GEO_MEDIAN, DADOS_GEO_ORIGINAIS, DADOS_LIMPOS
+
+COLUNAS_DESCARTADAS = ["index_right", "fullname", "abcode", "ansi"]
+COLUNAS_CONDADO = ["name", "abbrev"]
+
+
+def criar_pontos(df):
+    # um único array de pontos a partir das colunas, sem laço em Python
+    return gpd.GeoDataFrame(
+        df,
+        geometry=gpd.points_from_xy(df["longitude"], df["latitude"]),
+        crs="EPSG:4326",
+    )
+
+
+def associar_condados(df, gdf_counties):
+    gdf = criar_pontos(df)
+    gdf_counties = gdf_counties.to_crs(epsg=4326)
+
+    # o sjoin usa o STRtree do GeoDataFrame dos condados
+    # pontos em polígonos sobrepostos aparecem uma vez por condado, como nos notebooks
+    gdf_joined = gpd.sjoin(gdf, gdf_counties, how="left", predicate="within")
+    gdf_joined = gdf_joined.drop(columns=COLUNAS_DESCARTADAS, errors="ignore")
+
+    faltantes = gdf_joined["name"].isna()
+    if faltantes.any():
+        # mesmo critério do condado_mais_proximo dos notebooks: centroide mais
+        # próximo em graus, resolvido de uma vez com sjoin_nearest
+        centroides = gpd.GeoDataFrame(
+            gdf_counties[COLUNAS_CONDADO],
+            geometry=gdf_counties.centroid,
+            crs=gdf_counties.crs,
+        )
+        with warnings.catch_warnings():
+            warnings.filterwarnings("ignore", message=".*geographic CRS.*")
+            mais_proximos = gpd.sjoin_nearest(
+                gdf_joined.loc[faltantes, ["geometry"]], centroides, how="left"
+            )
+        # empates de distância geram mais de uma linha, na ordem do
+        # sjoin_nearest; ordenando pelo índice do condado, fica o de menor
+        # índice, como no distancias.idxmin() dos notebooks
+        mais_proximos = mais_proximos.sort_values("index_right", kind="stable")
+        mais_proximos = mais_proximos[~mais_proximos.index.duplicated(keep="first")]
+
+        gdf_joined.loc[faltantes, COLUNAS_CONDADO] = mais_proximos.loc[
+            gdf_joined.index[faltantes], COLUNAS_CONDADO
+        ].to_numpy()
+
+    return gdf_joined
+
+
+def moda_por_condado(gdf_joined, coluna="ocean_proximity"):
+    # categoria mais frequente por condado; no empate fica a primeira em ordem,
+    # como o primeiro valor de pd.Series.mode
+    contagem = (
+        gdf_joined.groupby(["name", coluna], observed=True)
+        .size()
+        .reset_index(name="contagem")
+        .sort_values(["name", "contagem", coluna], ascending=[True, False, True])
+    )
+    return contagem.drop_duplicates(subset="name").set_index("name")[coluna]
+
+
+def agregar_condados(gdf_counties, gdf_joined):
+    gdf_counties = gdf_counties.to_crs(epsg=4326)
+
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", message=".*geographic CRS.*")
+        gdf_counties["centroid"] = gdf_counties.centroid
+
+    gdf_counties = gdf_counties.merge(
+        gdf_joined.groupby("name").median(numeric_only=True),
+        left_on="name",
+        right_index=True,
+    )
+
+    return gdf_counties.merge(
+        moda_por_condado(gdf_joined),
+        left_on="name",
+        right_index=True,
+    )
+
+
+def construir_dados_geo(
+    caminho_dados=DADOS_LIMPOS,
+    caminho_geo=DADOS_GEO_ORIGINAIS,
+    caminho_saida=DADOS_GEO_MEDIAN,
+):
+    df = pd.read_parquet(caminho_dados)
+    gdf_counties = gpd.read_file(caminho_geo)
+
+    gdf_joined = associar_condados(df, gdf_counties)
+    gdf_counties = agregar_condados(gdf_counties, gdf_joined)
+
+    if caminho_saida is not None:
+        gdf_counties.to_parquet(caminho_saida)
+
+    return gdf_counties
+
+
+if __name__ == "__main__":
+    gdf_counties = construir_dados_geo()
+    print(f"{len(gdf_counties)} condados salvos em {DADOS_GEO_MEDIAN}")
@@ -2,9 +2,8 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 
 from matplotlib.ticker import EngFormatter
-from sklearn.metrics import PredictionErrorDisplay
 
-from .models import RANDOM_STATE
+from .config import RANDOM_STATE
 
 sns.set_theme(palette="bright")
 
@@ -24,6 +23,9 @@ def plot_coeficientes(df_coefs, tituto="Coeficientes"):
 def plot_residuos(y_true, y_pred):
     residuos = y_true - y_pred
 
+    # import local: sklearn.metrics só é carregado quando há gráfico de resíduos
+    from sklearn.metrics import PredictionErrorDisplay
+
     fig, axs = plt.subplots(1, 3, figsize=(12, 6))
 
     sns.histplot(residuos, kde=True, ax=axs[0])
@@ -49,6 +51,8 @@ def plot_residuos_estimador(estimator, X, y, eng_formatter=True, fracao_amostra=
 
     # fig, axs = plt.subplots(1, 3, figsize=figsize)
 
+    from sklearn.metrics import PredictionErrorDisplay
+
     error_display_01 = PredictionErrorDisplay.from_estimator(
         estimator,
         X,
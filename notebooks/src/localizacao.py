@@ -0,0 +1,81 @@
+import numpy as np
+import shapely
+
+from .atributos import TIPOS_MODELO
+from .condados import construir_tabela_condados, entradas_modelo_condados
+from .config import DADOS_GEO_MEDIAN
+from .geometrias import ler_geometrias
+
+
+class IndiceCondados:
+
+    def __init__(self, nomes, geometrias, tabela_condados):
+        geometrias = np.array(geometrias, dtype=object)
+        invalidas = ~shapely.is_valid(geometrias)
+        geometrias[invalidas] = shapely.buffer(geometrias[invalidas], 0)
+
+        self.nomes = np.asarray(nomes)
+        self.tabela_condados = tabela_condados
+
+        # árvores construídas uma única vez; cada consulta resolve todos os
+        # pontos de uma vez, sem percorrer os polígonos ponto a ponto
+        self._arvore = shapely.STRtree(geometrias)
+        self._arvore_centroides = shapely.STRtree(shapely.centroid(geometrias))
+
+    @classmethod
+    def carregar(cls, caminho=DADOS_GEO_MEDIAN, tabela_condados=None):
+        if tabela_condados is None:
+            tabela_condados = construir_tabela_condados(caminho)
+        nomes, geometrias = ler_geometrias(caminho)
+        return cls(nomes, geometrias, tabela_condados)
+
+    def localizar(self, longitude, latitude):
+        pontos = shapely.points(
+            np.atleast_1d(np.asarray(longitude, dtype=np.float64)),
+            np.atleast_1d(np.asarray(latitude, dtype=np.float64)),
+        )
+
+        indices = np.full(len(pontos), -1, dtype=np.int64)
+        # "intersects" inclui a borda do polígono ("within" a exclui): pontos na
+        # divisa de dois condados casam com os dois e ficam com o primeiro
+        indice_ponto, indice_condado = self._arvore.query(pontos, predicate="intersects")
+
+        indice_ponto, primeiros = np.unique(indice_ponto, return_index=True)
+        indices[indice_ponto] = indice_condado[primeiros]
+
+        # mesmo critério do condado_mais_proximo dos notebooks: pontos fora de
+        # todos os polígonos vão para o condado de centroide mais próximo
+        faltantes = np.flatnonzero(indices == -1)
+        if len(faltantes):
+            indice_ponto, indice_condado = self._arvore_centroides.query_nearest(
+                pontos[faltantes], all_matches=False
+            )
+            indices[faltantes[indice_ponto]] = indice_condado
+
+        return self.nomes[indices]
+
+    def entradas_modelo(
+        self,
+        longitude,
+        latitude,
+        housing_median_age,
+        median_income,
+        usar_coordenadas=True,
+    ):
+        condados = self.localizar(longitude, latitude)
+        entrada = entradas_modelo_condados(
+            self.tabela_condados, condados, housing_median_age, median_income
+        )
+
+        # com usar_coordenadas=False o ponto recebe a posição mediana do condado,
+        # como na seleção de condado dos apps
+        if usar_coordenadas:
+            # mesmos tipos da entrada por condado e do treinamento
+            entrada["longitude"] = np.broadcast_to(
+                np.asarray(longitude, dtype=TIPOS_MODELO["longitude"]), len(entrada)
+            )
+            entrada["latitude"] = np.broadcast_to(
+                np.asarray(latitude, dtype=TIPOS_MODELO["latitude"]), len(entrada)
+            )
+
+        return entrada
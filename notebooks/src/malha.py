@@ -0,0 +1,195 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .assinaturas import assinatura_arquivo
+from .config import DADOS_LIMPOS, MALHA_HEXAGONAL
+from .dados import carregar_dados_limpos
+from .geometrias import CASAS_DECIMAIS, servir_nivel
+
+# zoom mínimo do ViewState -> raio do hexágono em graus de latitude.
+# 0.1 grau equivale a cerca de 11 km
+RESOLUCOES_MALHA = {
+    0: 0.25,
+    7: 0.1,
+    9: 0.03,
+}
+
+# latitude de referência para corrigir a longitude, de modo que os hexágonos
+# tenham aproximadamente a mesma largura e altura em km na Califórnia
+LATITUDE_REFERENCIA = 37.0
+
+# chave, nos metadados do parquet, da assinatura dos dados de origem
+CHAVE_ASSINATURA = b"assinatura_dados"
+
+COLUNAS_AGREGADAS = ["median_house_value", "median_income"]
+
+# vértices de um hexágono "pointy-top" de raio 1, no sentido anti-horário
+_ANGULOS = np.deg2rad(30 + 60 * np.arange(6))
+_VERTICES = np.column_stack([np.cos(_ANGULOS), np.sin(_ANGULOS)])
+
+
+def _escala_longitude(latitude_referencia=LATITUDE_REFERENCIA):
+    return np.cos(np.deg2rad(latitude_referencia))
+
+
+def indices_hexagonos(longitude, latitude, tamanho):
+    # coordenadas axiais (q, r) de cada ponto, com arredondamento cúbico
+    x = np.asarray(longitude, dtype=np.float64) * _escala_longitude()
+    y = np.asarray(latitude, dtype=np.float64)
+
+    q = (np.sqrt(3) / 3 * x - y / 3) / tamanho
+    r = (2 / 3 * y) / tamanho
+    s = -q - r
+
+    q_arredondado, r_arredondado, s_arredondado = np.round(q), np.round(r), np.round(s)
+    dq = np.abs(q_arredondado - q)
+    dr = np.abs(r_arredondado - r)
+    ds = np.abs(s_arredondado - s)
+
+    corrigir_q = (dq > dr) & (dq > ds)
+    corrigir_r = ~corrigir_q & (dr > ds)
+    q_arredondado[corrigir_q] = -r_arredondado[corrigir_q] - s_arredondado[corrigir_q]
+    r_arredondado[corrigir_r] = -q_arredondado[corrigir_r] - s_arredondado[corrigir_r]
+
+    return q_arredondado.astype(np.int32), r_arredondado.astype(np.int32)
+
+
+def centros_hexagonos(q, r, tamanho):
+    x = tamanho * np.sqrt(3) * (q + r / 2)
+    y = tamanho * 1.5 * r
+    return x / _escala_longitude(), y
+
+
+def agregar_malha(df, tamanho):
+    q, r = indices_hexagonos(df["longitude"], df["latitude"], tamanho)
+
+    df_malha = (
+        df[COLUNAS_AGREGADAS]
+        .assign(q=q, r=r)
+        .groupby(["q", "r"])
+        .agg(
+            contagem=("median_house_value", "size"),
+            median_house_value=("median_house_value", "median"),
+            median_income=("median_income", "median"),
+        )
+        .reset_index()
+    )
+
+    longitude, latitude = centros_hexagonos(df_malha["q"], df_malha["r"], tamanho)
+    df_malha.insert(2, "longitude", longitude)
+    df_malha.insert(3, "latitude", latitude)
+
+    return df_malha
+
+
+def construir_malha(
+    caminho_dados=DADOS_LIMPOS,
+    caminho_saida=MALHA_HEXAGONAL,
+    resolucoes=RESOLUCOES_MALHA,
+):
+    df = carregar_dados_limpos(
+        ["longitude", "latitude"] + COLUNAS_AGREGADAS, caminho=caminho_dados
+    )
+
+    df_malha = pd.concat(
+        [
+            agregar_malha(df, tamanho).assign(zoom_minimo=zoom, tamanho=tamanho)
+            for zoom, tamanho in sorted(resolucoes.items())
+        ],
+        ignore_index=True,
+    )
+
+    # tipos compactos; os apps leem apenas as linhas de um zoom_minimo
+    df_malha = df_malha.astype(
+        {
+            "zoom_minimo": np.int8,
+            "tamanho": np.float32,
+            "contagem": np.int32,
+            "longitude": np.float32,
+            "latitude": np.float32,
+            "median_house_value": np.float32,
+            "median_income": np.float32,
+        }
+    )
+
+    # a assinatura de DADOS_LIMPOS vai nos metadados do parquet, como a da
+    # superfície de previsões no .npz
+    tabela = pa.Table.from_pandas(df_malha, preserve_index=False)
+    tabela = tabela.replace_schema_metadata(
+        {**tabela.schema.metadata, CHAVE_ASSINATURA: assinatura_arquivo(caminho_dados)}
+    )
+    pq.write_table(tabela, caminho_saida)
+
+    return caminho_saida
+
+
+def _malha_atualizada(caminho, caminho_dados):
+    if not caminho.exists():
+        return False
+    metadados = pq.read_schema(caminho).metadata or {}
+    return metadados.get(CHAVE_ASSINATURA) == assinatura_arquivo(caminho_dados).encode()
+
+
+def hexagonos_pydeck(df_malha):
+    # vértices calculados de uma vez para todas as células, no mesmo formato
+    # [[anel]] dos polígonos de condados
+    tamanho = df_malha["tamanho"].to_numpy(dtype=np.float64)[:, np.newaxis, np.newaxis]
+    centros = df_malha[["longitude", "latitude"]].to_numpy(dtype=np.float64)
+
+    deslocamentos = _VERTICES * tamanho
+    deslocamentos[..., 0] /= _escala_longitude()
+    vertices = np.round(centros[:, np.newaxis, :] + deslocamentos, CASAS_DECIMAIS)
+
+    # cor de azul (mais barato) a vermelho (mais caro) pelo valor mediano
+    valores = df_malha["median_house_value"].to_numpy(dtype=np.float64)
+    amplitude = np.ptp(valores) or 1.0
+    intensidade = np.round(255 * (valores - valores.min()) / amplitude).astype(int)
+    cores = np.column_stack(
+        [intensidade, np.full_like(intensidade, 80), 255 - intensidade]
+    )
+
+    return pd.DataFrame(
+        {
+            "geometry": [[anel] for anel in vertices.tolist()],
+            "cor": cores.tolist(),
+            "contagem": df_malha["contagem"].to_numpy(),
+            "median_house_value": valores.round(0),
+            "median_income": df_malha["median_income"].to_numpy(dtype=np.float64).round(2),
+        }
+    )
+
+
+def carregar_malha(
+    zoom=0,
+    payload_maximo_kb=None,
+    caminho=MALHA_HEXAGONAL,
+    caminho_dados=DADOS_LIMPOS,
+):
+    # como nos polígonos, a resolução do zoom pedido ou, se o JSON passar de
+    # payload_maximo_kb, a mais fina entre as menores que caiba. A malha é
+    # refeita se não existe ou foi gerada a partir de outros dados limpos
+    if not _malha_atualizada(caminho, caminho_dados):
+        construir_malha(caminho_dados, caminho)
+
+    zooms = np.unique(pd.read_parquet(caminho, columns=["zoom_minimo"])["zoom_minimo"])
+    return servir_nivel(
+        zooms,
+        zoom,
+        lambda nivel: hexagonos_pydeck(
+            pd.read_parquet(caminho, filters=[("zoom_minimo", "==", nivel)])
+        ),
+        payload_maximo_kb,
+    )
+
+
+if __name__ == "__main__":
+    caminho = construir_malha()
+    df_malha = pd.read_parquet(caminho)
+    print(f"Malha hexagonal salva em {caminho}")
+    print(
+        df_malha.groupby(["zoom_minimo", "tamanho"])
+        .agg(celulas=("contagem", "size"), pontos=("contagem", "sum"))
+        .to_string()
+    )
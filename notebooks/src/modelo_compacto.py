@@ -0,0 +1,199 @@
+import numpy as np
+
+from scipy.special import ndtr
+
+from .assinaturas import assinatura_arquivo
+from .config import MODELO_COMPACTO, MODELO_FINAL
+
+# mesmo limite usado pelo QuantileTransformer do scikit-learn
+BOUNDS_THRESHOLD = 1e-7
+
+
+def _codificar(valores, categorias, coluna):
+    # categorias do scikit-learn são ordenadas, então a busca binária basta
+    valores = np.asarray(valores, dtype=str if categorias.dtype.kind == "U" else np.float64)
+    posicoes = np.searchsorted(categorias, valores).clip(0, len(categorias) - 1)
+    desconhecidas = categorias[posicoes] != valores
+    if desconhecidas.any():
+        raise ValueError(
+            f"Categorias desconhecidas em {coluna}: {sorted(set(valores[desconhecidas]))}"
+        )
+    return posicoes
+
+
+def exportar_modelo_compacto(
+    modelo, caminho=MODELO_COMPACTO, caminho_modelo=MODELO_FINAL
+):
+    # TransformedTargetRegressor -> Pipeline -> ColumnTransformer + Ridge.
+    # a assinatura de `caminho_modelo` (o .joblib de onde `modelo` veio) liga
+    # os arrays ao modelo, para que um novo dump não fique sem efeito
+    pipeline = modelo.regressor_
+    quantile = modelo.transformer_
+    reg = pipeline["reg"]
+
+    if quantile.output_distribution != "normal":
+        raise ValueError("Apenas QuantileTransformer com saída normal é suportado.")
+
+    transformers = {
+        nome: (transformer, colunas)
+        for nome, transformer, colunas in pipeline["preprocessor"].transformers_
+    }
+    ordinal, colunas_ordinal = transformers["ordinal_encoder"]
+    one_hot, colunas_one_hot = transformers["one_hot"]
+    robust_poly, colunas_robust = transformers["robust_scaler_poly"]
+
+    np.savez(
+        caminho,
+        colunas_modelo=np.asarray(modelo.feature_names_in_, dtype=str),
+        coluna_ordinal=np.asarray(colunas_ordinal, dtype=str),
+        categorias_ordinal=np.asarray(ordinal.categories_[0], dtype=np.float64),
+        coluna_one_hot=np.asarray(colunas_one_hot, dtype=str),
+        categorias_one_hot=np.asarray(one_hot.categories_[0], dtype=str),
+        one_hot_drop=np.asarray(one_hot.drop_idx_[0]),
+        colunas_robust=np.asarray(colunas_robust, dtype=str),
+        centro=robust_poly["robust_scaler"].center_,
+        escala=robust_poly["robust_scaler"].scale_,
+        potencias=robust_poly["poly"].powers_,
+        coef=np.asarray(reg.coef_, dtype=np.float64).ravel(),
+        intercept=np.asarray(reg.intercept_, dtype=np.float64).ravel(),
+        quantis=quantile.quantiles_[:, 0],
+        referencias=quantile.references_,
+        assinatura_modelo=np.array(assinatura_arquivo(caminho_modelo)),
+    )
+
+    return caminho
+
+
+def garantir_modelo_compacto(caminho=MODELO_COMPACTO, caminho_modelo=MODELO_FINAL):
+    # refaz a exportação se ela não existe ou veio de outro dump do modelo;
+    # sem o .joblib de origem, o .npz existente é o único modelo disponível
+    if caminho.exists():
+        if not caminho_modelo.exists():
+            return caminho
+        with np.load(caminho) as arquivo:
+            if "assinatura_modelo" in arquivo and str(
+                arquivo["assinatura_modelo"]
+            ) == assinatura_arquivo(caminho_modelo):
+                return caminho
+
+    # joblib e sklearn só são importados para exportar de novo
+    from joblib import load
+
+    return exportar_modelo_compacto(load(caminho_modelo), caminho, caminho_modelo)
+
+
+def etapas_polinomio(potencias):
+    # cada termo de grau g é um termo de grau g - 1 (o "pai") vezes uma coluna,
+    # o que permite calcular todos os termos de um grau com uma única operação
+    graus = potencias.sum(axis=1)
+    indices = {tuple(termo): i for i, termo in enumerate(potencias.tolist())}
+    unitarios = np.eye(potencias.shape[1], dtype=potencias.dtype)
+
+    etapas = []
+    for grau in range(1, graus.max() + 1):
+        termos = np.flatnonzero(graus == grau)
+        colunas = np.array([np.flatnonzero(potencias[t])[-1] for t in termos])
+        pais = (
+            np.array(
+                [
+                    indices[tuple((potencias[t] - unitarios[c]).tolist())]
+                    for t, c in zip(termos, colunas)
+                ]
+            )
+            if grau > 1
+            else None
+        )
+        etapas.append((termos, colunas, pais))
+
+    return etapas
+
+
+class ModeloCompacto:
+
+    def __init__(self, arrays):
+        for nome, valor in arrays.items():
+            setattr(self, nome, valor)
+        self.feature_names_in_ = self.colunas_modelo
+        self._etapas = etapas_polinomio(self.potencias)
+
+    @classmethod
+    def carregar(cls, caminho=MODELO_COMPACTO, caminho_modelo=MODELO_FINAL):
+        garantir_modelo_compacto(caminho, caminho_modelo)
+        with np.load(caminho) as arquivo:
+            return cls({nome: arquivo[nome] for nome in arquivo.files})
+
+    def _termos(self, X):
+        n_linhas = len(X[self.colunas_robust[0]])
+
+        ordinal = _codificar(
+            X[str(self.coluna_ordinal[0])], self.categorias_ordinal, "ordinal"
+        )
+
+        posicoes = _codificar(
+            X[str(self.coluna_one_hot[0])], self.categorias_one_hot, "one_hot"
+        )
+        mantidas = np.delete(np.arange(len(self.categorias_one_hot)), self.one_hot_drop)
+        one_hot = posicoes[:, np.newaxis] == mantidas
+
+        X_robust = np.column_stack(
+            [np.asarray(X[coluna], dtype=np.float64) for coluna in self.colunas_robust]
+        )
+        X_robust = (X_robust - self.centro) / self.escala
+
+        # termos do PolynomialFeatures calculados grau a grau, em layout
+        # (termos x linhas) para que cada termo seja uma linha contígua
+        X_robust = np.ascontiguousarray(X_robust.T)
+        X_poly = np.ones((len(self.potencias), n_linhas))
+        for termos, colunas, pais in self._etapas:
+            if pais is None:
+                X_poly[termos] = X_robust[colunas]
+            else:
+                X_poly[termos] = X_poly[pais] * X_robust[colunas]
+
+        return ordinal, one_hot, X_poly
+
+    def transformar(self, X):
+        # matriz de entrada do Ridge, na ordem de saída do ColumnTransformer
+        ordinal, one_hot, X_poly = self._termos(X)
+        return np.column_stack([ordinal, one_hot, X_poly.T])
+
+    def predict(self, X):
+        # produto com os coeficientes bloco a bloco, sem montar a matriz completa
+        ordinal, one_hot, X_poly = self._termos(X)
+        n_one_hot = one_hot.shape[1]
+        y_normal = (
+            ordinal * self.coef[0]
+            + one_hot @ self.coef[1 : 1 + n_one_hot]
+            + self.coef[1 + n_one_hot :] @ X_poly
+            + self.intercept[0]
+        )
+
+        # inversa do QuantileTransformer(output_distribution="normal")
+        y_uniforme = ndtr(y_normal)
+        y = np.interp(y_uniforme, self.referencias, self.quantis)
+        y[y_uniforme + BOUNDS_THRESHOLD > 1] = self.quantis[-1]
+        y[y_uniforme - BOUNDS_THRESHOLD < 0] = self.quantis[0]
+
+        # mesmo formato (n, 1) do modelo treinado com y em DataFrame
+        return y[:, np.newaxis]
+
+
+def validar_modelo_compacto(modelo, compacto, X):
+    colunas = list(modelo.feature_names_in_)
+    esperado = np.asarray(modelo.predict(X[colunas])).ravel()
+    obtido = compacto.predict(X).ravel()
+    return float(np.max(np.abs(obtido - esperado) / np.abs(esperado)))
+
+
+if __name__ == "__main__":
+    # pandas e joblib só são necessários para exportar, não para prever
+    from joblib import load
+
+    from .dados import carregar_dados_limpos
+
+    modelo = load(MODELO_FINAL)
+    exportar_modelo_compacto(modelo)
+
+    X = carregar_dados_limpos(list(modelo.feature_names_in_), otimizar=False)
+    erro = validar_modelo_compacto(modelo, ModeloCompacto.carregar(), X)
+    print(f"Modelo compacto salvo em {MODELO_COMPACTO} (erro relativo máximo: {erro:.2e})")
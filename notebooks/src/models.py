@@ -1,17 +1,52 @@
+import time
+
+from pathlib import Path
+
+import joblib
+import numpy as np
 import pandas as pd
 
+from scipy import sparse
+from sklearn.base import BaseEstimator, RegressorMixin, clone
 from sklearn.compose import TransformedTargetRegressor
-from sklearn.model_selection import KFold, cross_validate, GridSearchCV
+from sklearn.metrics import (
+    mean_absolute_error,
+    r2_score,
+    root_mean_squared_error,
+)
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+from sklearn.model_selection import (
+    KFold,
+    cross_validate,
+    GridSearchCV,
+    HalvingGridSearchCV,
+    ParameterGrid,
+    RandomizedSearchCV,
+)
+from sklearn.linear_model import Ridge
 from sklearn.pipeline import Pipeline
+from sklearn.utils import _safe_indexing
+
+from .cache_pipeline import MemoriaLimitada, criar_memoria
 
-RANDOM_STATE = 42
+# definido em config para que módulos sem sklearn (graficos) não importem este;
+# continua disponível aqui para os notebooks
+from .config import RANDOM_STATE
+
+MODOS_BUSCA = ("grid", "halving", "aleatoria")
 
 
 def construir_pipeline_modelo_regressao(
-    regressor, preprocessor=None, target_transformer=None
+    regressor, preprocessor=None, target_transformer=None, memoria=None
 ):
+    # memoria: pasta ou MemoriaLimitada (cache_pipeline.py) em que o
+    # preprocessor ajustado em cada fold fica guardado; numa busca, os
+    # candidatos que só mudam o regressor reaproveitam o mesmo ajuste
+    memoria = criar_memoria(memoria)
     if preprocessor is not None:
-        pipeline = Pipeline([("preprocessor", preprocessor), ("reg", regressor)])
+        pipeline = Pipeline(
+            [("preprocessor", preprocessor), ("reg", regressor)], memory=memoria
+        )
     else:
         pipeline = Pipeline([("reg", regressor)])
 
@@ -32,10 +67,12 @@ def treinar_e_validar_modelo_regressao(
     target_transformer=None,
     n_splits=5,
     random_state=RANDOM_STATE,
+    memoria=None,
 ):
+    memoria = criar_memoria(memoria)
 
     model = construir_pipeline_modelo_regressao(
-        regressor, preprocessor, target_transformer
+        regressor, preprocessor, target_transformer, memoria
     )
 
     kf = KFold(n_splits=n_splits, shuffle=True, random_state=random_state)
@@ -52,6 +89,9 @@ def treinar_e_validar_modelo_regressao(
         ],
     )
 
+    if isinstance(memoria, MemoriaLimitada):
+        memoria.limitar()
+
     return scores
 
 
@@ -63,27 +103,376 @@ def grid_search_cv_regressor(
     n_splits=5,
     random_state=RANDOM_STATE,
     return_train_score=False,
+    modo_busca="grid",
+    n_iter=10,
+    fator_halving=3,
+    memoria=None,
 ):
+    # devolve a busca ainda não treinada; o fit fica com quem chama.
+    # no modo "halving" o cv_results_ tem apenas a métrica do refit
+    # (mean_test_score, sem mean_test_r2 etc.) e uma linha por candidato em
+    # cada iteração, com as colunas iter e n_resources.
+    # com memoria, relatorio_cache(memoria, desde=...) mostra os acertos do
+    # cache depois do fit da busca
+    if modo_busca not in MODOS_BUSCA:
+        raise ValueError(f"modo_busca deve ser um de {MODOS_BUSCA}")
+
     model = construir_pipeline_modelo_regressao(
-        regressor, preprocessor, target_transformer
+        regressor, preprocessor, target_transformer, memoria
     )
 
     kf = KFold(n_splits=n_splits, shuffle=True, random_state=random_state)
 
-    grid_search = GridSearchCV(
-        model,
-        cv=kf,
-        param_grid=param_grid,
-        scoring=["r2", "neg_mean_absolute_error", "neg_root_mean_squared_error"],
-        refit="neg_root_mean_squared_error",
-        n_jobs=-1,
-        return_train_score=return_train_score,
-        verbose=1,
-    )
+    scoring = ["r2", "neg_mean_absolute_error", "neg_root_mean_squared_error"]
+    refit = "neg_root_mean_squared_error"
+
+    if modo_busca == "halving":
+        # successive halving só aceita uma métrica: usamos a mesma do refit.
+        # os candidatos começam com poucas amostras e só os melhores recebem
+        # o conjunto completo
+        grid_search = HalvingGridSearchCV(
+            model,
+            cv=kf,
+            param_grid=param_grid,
+            scoring=refit,
+            factor=fator_halving,
+            n_jobs=-1,
+            return_train_score=return_train_score,
+            random_state=random_state,
+            verbose=1,
+        )
+    elif modo_busca == "aleatoria":
+        grid_search = RandomizedSearchCV(
+            model,
+            cv=kf,
+            param_distributions=param_grid,
+            n_iter=n_iter,
+            scoring=scoring,
+            refit=refit,
+            n_jobs=-1,
+            return_train_score=return_train_score,
+            random_state=random_state,
+            verbose=1,
+        )
+    else:
+        grid_search = GridSearchCV(
+            model,
+            cv=kf,
+            param_grid=param_grid,
+            scoring=scoring,
+            refit=refit,
+            n_jobs=-1,
+            return_train_score=return_train_score,
+            verbose=1,
+        )
 
     return grid_search
 
 
+def comparar_modos_busca(X, y, modos_busca=("grid", "halving"), **kwargs):
+    linhas = []
+    for modo_busca in modos_busca:
+        grid_search = grid_search_cv_regressor(modo_busca=modo_busca, **kwargs)
+
+        inicio = time.perf_counter()
+        grid_search.fit(X, y)
+        tempo = time.perf_counter() - inicio
+
+        linhas.append(
+            {
+                "modo_busca": modo_busca,
+                "tempo_seconds": tempo,
+                "ajustes": len(grid_search.cv_results_["params"])
+                * grid_search.n_splits_,
+                "best_score": grid_search.best_score_,
+                "best_params": grid_search.best_params_,
+            }
+        )
+
+    df_comparacao = pd.DataFrame(linhas).set_index("modo_busca")
+
+    # tempo economizado em relação à busca exaustiva, quando ela foi executada
+    if "grid" in df_comparacao.index:
+        tempo_exaustivo = df_comparacao.loc["grid", "tempo_seconds"]
+        df_comparacao["tempo_economizado_seconds"] = (
+            tempo_exaustivo - df_comparacao["tempo_seconds"]
+        )
+        df_comparacao["speedup"] = tempo_exaustivo / df_comparacao["tempo_seconds"]
+
+    return df_comparacao
+
+
+def _avaliar_grupo_fold(
+    X, y, indices_treino, indices_teste, preprocessor, modelos, arquivos=None
+):
+    # ajusta o preprocessor uma única vez no fold e reaproveita a saída do
+    # ColumnTransformer para todos os regressores que o compartilham.
+    # com `arquivos` ({nome_modelo: caminho}), cada resultado é gravado no
+    # próprio worker assim que calculado, para que uma execução interrompida
+    # possa ser retomada
+    X_treino = _safe_indexing(X, indices_treino)
+    X_teste = _safe_indexing(X, indices_teste)
+    y_treino = _safe_indexing(y, indices_treino)
+    y_teste = _safe_indexing(y, indices_teste)
+
+    tempo_ajuste_preprocessor = tempo_transformacao_teste = 0.0
+    if preprocessor is not None:
+        inicio = time.perf_counter()
+        preprocessor = clone(preprocessor)
+        X_treino = preprocessor.fit_transform(X_treino, y_treino)
+        tempo_ajuste_preprocessor = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        X_teste = preprocessor.transform(X_teste)
+        tempo_transformacao_teste = time.perf_counter() - inicio
+
+    resultados = {}
+    for nome_modelo, regressor, target_transformer in modelos:
+        model = construir_pipeline_modelo_regressao(
+            clone(regressor),
+            target_transformer=(
+                clone(target_transformer) if target_transformer is not None else None
+            ),
+        )
+
+        inicio = time.perf_counter()
+        model.fit(X_treino, y_treino)
+        fit_time = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        y_pred = model.predict(X_teste)
+        score_time = time.perf_counter() - inicio
+
+        # os tempos do preprocessor entram em cada modelo, como no cross_validate
+        resultados[nome_modelo] = {
+            "fit_time": fit_time + tempo_ajuste_preprocessor,
+            "score_time": score_time + tempo_transformacao_teste,
+            "test_r2": r2_score(y_teste, y_pred),
+            "test_neg_mean_absolute_error": -mean_absolute_error(y_teste, y_pred),
+            "test_neg_root_mean_squared_error": -root_mean_squared_error(
+                y_teste, y_pred
+            ),
+        }
+
+        if arquivos is not None:
+            # arquivo temporário e rename: uma interrupção no meio do dump não
+            # deixa um resultado corrompido que seria lido na retomada
+            arquivo = arquivos[nome_modelo]
+            temporario = arquivo.with_name(f".{arquivo.name}.tmp")
+            joblib.dump(resultados[nome_modelo], temporario)
+            temporario.replace(arquivo)
+
+    return resultados
+
+
+def treinar_e_validar_modelos_paralelo(
+    X,
+    y,
+    regressors,
+    n_splits=5,
+    random_state=RANDOM_STATE,
+    n_jobs=-1,
+    pasta_cache=None,
+):
+    kf = KFold(n_splits=n_splits, shuffle=True, random_state=random_state)
+    folds = list(kf.split(X))
+
+    if pasta_cache is not None:
+        pasta_cache = Path(pasta_cache)
+        pasta_cache.mkdir(parents=True, exist_ok=True)
+        hash_dados = joblib.hash((X, y))
+
+    def arquivo_resultado(nome_modelo, config, fold):
+        chave = joblib.hash((nome_modelo, config, n_splits, random_state, hash_dados))
+        return pasta_cache / f"{nome_modelo}_{chave}_fold{fold}.joblib"
+
+    resultados_fold = {}
+    grupos = {}
+    for nome_modelo, config in regressors.items():
+        preprocessor = config.get("preprocessor")
+        chave_preprocessor = joblib.hash(preprocessor)
+
+        for fold in range(n_splits):
+            if pasta_cache is not None:
+                arquivo = arquivo_resultado(nome_modelo, config, fold)
+                if arquivo.exists():
+                    resultados_fold[(nome_modelo, fold)] = joblib.load(arquivo)
+                    continue
+
+            grupo = grupos.setdefault(
+                (chave_preprocessor, fold),
+                {"preprocessor": preprocessor, "modelos": [], "arquivos": None},
+            )
+            grupo["modelos"].append(
+                (nome_modelo, config["regressor"], config.get("target_transformer"))
+            )
+            if pasta_cache is not None:
+                grupo["arquivos"] = grupo["arquivos"] or {}
+                grupo["arquivos"][nome_modelo] = arquivo
+
+    tarefas = (
+        joblib.delayed(_avaliar_grupo_fold)(
+            X,
+            y,
+            *folds[fold],
+            grupo["preprocessor"],
+            grupo["modelos"],
+            grupo["arquivos"],
+        )
+        for (_, fold), grupo in grupos.items()
+    )
+    saidas = joblib.Parallel(n_jobs=n_jobs)(tarefas)
+
+    for (_, fold), saida in zip(grupos, saidas):
+        for nome_modelo, resultado in saida.items():
+            resultados_fold[(nome_modelo, fold)] = resultado
+
+    # mesmo formato devolvido pelo cross_validate, aceito por organiza_resultados
+    return {
+        nome_modelo: {
+            metrica: np.array(
+                [resultados_fold[(nome_modelo, fold)][metrica] for fold in range(n_splits)]
+            )
+            for metrica in resultados_fold[(nome_modelo, 0)]
+        }
+        for nome_modelo in regressors
+    }
+
+
+# Ridge ajustado para vários alphas com uma única SVD da matriz centrada:
+# com X = U S Vᵀ, os coeficientes de cada alpha são V diag(s / (s² + alpha)) Uᵀ y,
+# então trocar de alpha não exige novo ajuste. `alpha` escolhe qual dos `alphas`
+# é usado em `predict`; `predict_caminho` devolve as previsões de todos.
+class RidgeCaminhoAlphas(RegressorMixin, BaseEstimator):
+
+    def __init__(self, alphas=(1.0,), alpha=None):
+        self.alphas = alphas
+        self.alpha = alpha
+
+    def fit(self, X, y):
+        X = X.toarray() if sparse.issparse(X) else np.asarray(X, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        self._y_1d = y.ndim == 1
+        y = y.reshape(len(y), -1)
+
+        self.X_offset_ = X.mean(axis=0)
+        self.y_offset_ = y.mean(axis=0)
+        U, s, Vt = np.linalg.svd(X - self.X_offset_, full_matrices=False)
+        UTy = U.T @ (y - self.y_offset_)
+
+        alphas = np.asarray(self.alphas, dtype=np.float64)
+        fatores = s / (s**2 + alphas[:, np.newaxis])  # (n_alphas, k)
+
+        # (n_alphas, n_targets, n_features), no mesmo layout do coef_ do Ridge
+        self.coefs_ = np.einsum("ak,kt,kf->atf", fatores, UTy, Vt)
+        self.intercepts_ = self.y_offset_ - self.coefs_ @ self.X_offset_
+        self.n_features_in_ = X.shape[1]
+
+        return self.selecionar_alpha(self.alphas[0] if self.alpha is None else self.alpha)
+
+    def selecionar_alpha(self, alpha):
+        indice = list(self.alphas).index(alpha)
+        self.alpha_ = alpha
+        self.coef_ = self.coefs_[indice][0] if self._y_1d else self.coefs_[indice]
+        self.intercept_ = (
+            self.intercepts_[indice][0] if self._y_1d else self.intercepts_[indice]
+        )
+        return self
+
+    def predict(self, X):
+        X = X.toarray() if sparse.issparse(X) else np.asarray(X, dtype=np.float64)
+        return X @ self.coef_.T + self.intercept_
+
+    def predict_caminho(self, X):
+        X = X.toarray() if sparse.issparse(X) else np.asarray(X, dtype=np.float64)
+        previsoes = np.einsum("nf,atf->ant", X, self.coefs_) + self.intercepts_[:, None]
+        return previsoes[..., 0] if self._y_1d else previsoes
+
+
+def grid_search_ridge_caminho(
+    X,
+    y,
+    param_grid,
+    preprocessor=None,
+    target_transformer=None,
+    n_splits=5,
+    random_state=RANDOM_STATE,
+    chave_alpha="regressor__reg__alpha",
+):
+    # o alpha sai da grade: para cada combinação dos demais parâmetros o pipeline
+    # é ajustado uma vez por fold e todos os alphas são avaliados a partir dele
+    param_grid = dict(param_grid)
+    alphas = list(param_grid.pop(chave_alpha))
+
+    model = construir_pipeline_modelo_regressao(
+        RidgeCaminhoAlphas(alphas=alphas), preprocessor, target_transformer
+    )
+    kf = KFold(n_splits=n_splits, shuffle=True, random_state=random_state)
+
+    linhas = []
+    for params in ParameterGrid(param_grid):
+        for fold, (indices_treino, indices_teste) in enumerate(kf.split(X)):
+            model_fold = clone(model).set_params(**params)
+
+            inicio = time.perf_counter()
+            model_fold.fit(
+                _safe_indexing(X, indices_treino), _safe_indexing(y, indices_treino)
+            )
+            fit_time = time.perf_counter() - inicio
+
+            if target_transformer is not None:
+                pipeline, transformer = model_fold.regressor_, model_fold.transformer_
+            else:
+                pipeline, transformer = model_fold, None
+
+            X_teste = _safe_indexing(X, indices_teste)
+            y_teste = np.asarray(_safe_indexing(y, indices_teste))
+            if "preprocessor" in pipeline.named_steps:
+                X_teste = pipeline["preprocessor"].transform(X_teste)
+            previsoes = pipeline["reg"].predict_caminho(X_teste)
+
+            for alpha, y_pred in zip(alphas, previsoes):
+                if transformer is not None:
+                    y_pred = transformer.inverse_transform(y_pred.reshape(len(y_pred), -1))
+                y_pred = y_pred.reshape(y_teste.shape)
+
+                linhas.append(
+                    {
+                        **params,
+                        chave_alpha: alpha,
+                        "fold": fold,
+                        "fit_time": fit_time / len(alphas),
+                        "test_r2": r2_score(y_teste, y_pred),
+                        "test_neg_mean_absolute_error": -mean_absolute_error(
+                            y_teste, y_pred
+                        ),
+                        "test_neg_root_mean_squared_error": -root_mean_squared_error(
+                            y_teste, y_pred
+                        ),
+                    }
+                )
+
+    colunas_params = list(param_grid) + [chave_alpha]
+    df_resultados = (
+        pd.DataFrame(linhas)
+        .drop(columns="fold")
+        .groupby(colunas_params)
+        .mean()
+        .add_prefix("mean_")
+        .sort_values("mean_test_neg_root_mean_squared_error", ascending=False)
+        .reset_index()
+    )
+
+    # refit com o Ridge do scikit-learn, gerando o mesmo tipo de artefato de sempre
+    melhores_parametros = df_resultados[colunas_params].head(1).to_dict("records")[0]
+    melhor_modelo = construir_pipeline_modelo_regressao(
+        Ridge(), preprocessor, target_transformer
+    ).set_params(**melhores_parametros)
+    melhor_modelo.fit(X, y)
+
+    return melhor_modelo, df_resultados
+
+
 def organiza_resultados(resultados):
 
     for chave, valor in resultados.items():
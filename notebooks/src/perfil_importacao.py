@@ -0,0 +1,105 @@
+import argparse
+import subprocess
+import sys
+
+import pandas as pd
+
+from .config import PASTA_PROJETO
+
+# módulos do caminho de serviço: apps e servidor devem importá-los sem carregar
+# bibliotecas de gráficos ou de geoprocessamento
+MODULOS_SERVICO = (
+    "notebooks.src.atributos",
+    "notebooks.src.cache_previsoes",
+    "notebooks.src.condados",
+    "notebooks.src.geometrias",
+    "notebooks.src.malha",
+    "notebooks.src.previsao_lote",
+    "notebooks.src.registro",
+    "notebooks.src.servidor",
+    "notebooks.src.superficie",
+)
+
+MODULOS_PESADOS = (
+    "geopandas",
+    "joblib",
+    "matplotlib",
+    "pyarrow.dataset",
+    "seaborn",
+    "shapely",
+    "sklearn",
+)
+
+
+def perfil_importacao(modulo):
+    # python -X importtime em um processo novo; tempos em microssegundos.
+    # um arquivo .py (ex.: home.py) é executado como script, com todos os
+    # imports feitos até a primeira previsão
+    if modulo.endswith(".py"):
+        comando = [sys.executable, "-X", "importtime", modulo]
+    else:
+        comando = [sys.executable, "-X", "importtime", "-c", f"import {modulo}"]
+
+    saida = subprocess.run(
+        comando,
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=PASTA_PROJETO,
+    )
+
+    linhas = []
+    for linha in saida.stderr.splitlines():
+        if not linha.startswith("import time:") or "[us]" in linha:
+            continue
+        proprio, acumulado, nome = linha.removeprefix("import time:").split("|")
+        linhas.append(
+            {
+                "modulo": nome.strip(),
+                "nivel": (len(nome) - len(nome.lstrip()) - 1) // 2,
+                "proprio_ms": int(proprio) / 1000,
+                "acumulado_ms": int(acumulado) / 1000,
+            }
+        )
+
+    return pd.DataFrame(linhas)
+
+
+def relatorio_importacao(modulos=MODULOS_SERVICO, principais=5):
+    linhas = []
+    for modulo in modulos:
+        df_perfil = perfil_importacao(modulo)
+        importados = set(df_perfil["modulo"])
+
+        # imports mais caros no primeiro nível abaixo do módulo ou do script
+        nivel = 0 if modulo.endswith(".py") else 1
+        dependencias = df_perfil.query("nivel == @nivel").nlargest(
+            principais, "acumulado_ms"
+        )
+
+        linhas.append(
+            {
+                "modulo": modulo,
+                "total_ms": df_perfil.query("nivel == 0")["acumulado_ms"].sum(),
+                "pesados": sorted(importados.intersection(MODULOS_PESADOS)),
+                "principais": ", ".join(
+                    f"{nome} ({tempo:.0f} ms)"
+                    for nome, tempo in zip(
+                        dependencias["modulo"], dependencias["acumulado_ms"]
+                    )
+                ),
+            }
+        )
+
+    return pd.DataFrame(linhas).set_index("modulo")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Perfil de tempo de importação dos módulos de serviço."
+    )
+    parser.add_argument("modulos", nargs="*", default=MODULOS_SERVICO)
+    args = parser.parse_args()
+
+    with pd.option_context("display.max_colwidth", None, "display.width", 200):
+        print(relatorio_importacao(args.modulos).to_string())
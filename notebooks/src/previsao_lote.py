@@ -0,0 +1,156 @@
+import argparse
+
+from pathlib import Path
+
+import numpy as np
+
+from .condados import construir_tabela_condados, entradas_modelo_condados
+from .config import MODELO_FINAL
+from .modelo_compacto import ModeloCompacto
+
+TAMANHO_LOTE = 50_000
+COLUNA_PREVISAO = "preco_previsto"
+
+FORMATOS_ARROW = (".arrow", ".feather", ".ipc")
+
+
+def carregar_modelo(caminho=MODELO_FINAL, tabelar_alvo=False):
+    # .npz é o modelo compacto exportado por modelo_compacto.py; uma pasta de
+    # .npy é o mesmo modelo mapeado em memória (artefatos_mmap.py)
+    if Path(caminho).is_dir():
+        from .artefatos_mmap import carregar_modelo_mmap
+
+        return carregar_modelo_mmap(caminho)
+    if Path(caminho).suffix == ".npz":
+        return ModeloCompacto.carregar(caminho)
+
+    from joblib import load
+
+    modelo = load(caminho)
+    if tabelar_alvo:
+        # inversa do QuantileTransformer do alvo por tabela (QuantilTabelado)
+        from . import transformadores
+
+        modelo = transformadores.tabelar_alvo(modelo)
+    return modelo
+
+
+def abrir_entrada(caminho):
+    # import local: pyarrow.dataset é pesado e só é usado na previsão em lote
+    import pyarrow.dataset as ds
+
+    # parquet ou arrow IPC (feather v2), lidos em lotes pelo pyarrow.dataset
+    formato = "ipc" if Path(caminho).suffix in FORMATOS_ARROW else "parquet"
+    return ds.dataset(caminho, format=formato)
+
+
+def prever_em_lote(modelo, X, tamanho_lote=TAMANHO_LOTE):
+    colunas = list(modelo.feature_names_in_)
+    previsoes = np.empty(len(X), dtype=np.float64)
+
+    for inicio in range(0, len(X), tamanho_lote):
+        fim = inicio + tamanho_lote
+        previsoes[inicio:fim] = modelo.predict(X.iloc[inicio:fim][colunas]).ravel()
+
+    return previsoes
+
+
+def completar_com_condados(df, tabela_condados):
+    # entradas no formato condado/idade/renda recebem as medianas do condado
+    return entradas_modelo_condados(
+        tabela_condados,
+        df["name"].to_numpy(),
+        df["housing_median_age"].to_numpy(),
+        df["median_income"].to_numpy(),
+    )
+
+
+def completar_com_coordenadas(df, indice_condados):
+    # entradas no formato longitude/latitude/idade/renda: o condado de cada
+    # ponto vem do índice espacial e fornece as demais medianas
+    return indice_condados.entradas_modelo(
+        df["longitude"].to_numpy(),
+        df["latitude"].to_numpy(),
+        df["housing_median_age"].to_numpy(),
+        df["median_income"].to_numpy(),
+    )
+
+
+def pontuar_arquivo(
+    entrada,
+    saida,
+    modelo=None,
+    tamanho_lote=TAMANHO_LOTE,
+    tabela_condados=None,
+    indice_condados=None,
+):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if modelo is None:
+        modelo = carregar_modelo()
+
+    dataset = abrir_entrada(entrada)
+    escritor = None
+    total_linhas = 0
+
+    try:
+        for lote in dataset.to_batches(batch_size=tamanho_lote):
+            if lote.num_rows == 0:
+                continue
+
+            df_lote = lote.to_pandas()
+
+            if "total_rooms" in df_lote.columns:
+                X_lote = df_lote
+            elif "longitude" in df_lote.columns:
+                if indice_condados is None:
+                    # shapely só é importado quando há pontos a localizar
+                    from .localizacao import IndiceCondados
+
+                    indice_condados = IndiceCondados.carregar(
+                        tabela_condados=tabela_condados
+                    )
+                X_lote = completar_com_coordenadas(df_lote, indice_condados)
+            else:
+                if tabela_condados is None:
+                    tabela_condados = construir_tabela_condados()
+                X_lote = completar_com_condados(df_lote, tabela_condados)
+
+            df_lote[COLUNA_PREVISAO] = prever_em_lote(modelo, X_lote, tamanho_lote)
+
+            tabela = pa.Table.from_pandas(df_lote, preserve_index=False)
+            if escritor is None:
+                escritor = pq.ParquetWriter(saida, tabela.schema)
+            escritor.write_table(tabela)
+
+            total_linhas += lote.num_rows
+    finally:
+        if escritor is not None:
+            escritor.close()
+
+    return total_linhas
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Previsão em lote de preços a partir de arquivos Parquet ou Arrow."
+    )
+    parser.add_argument("entrada", help="arquivo .parquet, .arrow ou .feather")
+    parser.add_argument("saida", help="arquivo .parquet de saída")
+    parser.add_argument("--modelo", default=MODELO_FINAL)
+    parser.add_argument("--tamanho-lote", type=int, default=TAMANHO_LOTE)
+    parser.add_argument(
+        "--tabelar-alvo",
+        action="store_true",
+        help="inversa do alvo por tabela, com erro limitado (modelo .joblib)",
+    )
+    args = parser.parse_args()
+
+    linhas = pontuar_arquivo(
+        args.entrada,
+        args.saida,
+        modelo=carregar_modelo(args.modelo, args.tabelar_alvo),
+        tamanho_lote=args.tamanho_lote,
+    )
+    print(f"{linhas} linhas pontuadas em {args.saida}")
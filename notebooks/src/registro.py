@@ -0,0 +1,429 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import threading
+
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+from .atributos import COLUNAS_MODELO, TIPOS_MODELO
+from .config import MODELO_FINAL, PASTA_REGISTRO, SUPERFICIE_PREVISOES
+from .previsao_lote import carregar_modelo
+from .superficie import assinatura_modelo, construir_superficie
+
+ARQUIVO_MODELO = "modelo.joblib"
+ARQUIVO_SUPERFICIE = "superficie.npz"
+ARQUIVO_METADADOS = "metadados.json"
+ARQUIVO_ATIVO = "ativo.json"
+
+# segundos entre as leituras do ponteiro da versão ativa
+INTERVALO_VERIFICACAO = 5.0
+
+
+def _sha256(caminho):
+    hash_arquivo = hashlib.sha256()
+    with open(caminho, "rb") as arquivo:
+        for bloco in iter(lambda: arquivo.read(1 << 20), b""):
+            hash_arquivo.update(bloco)
+    return hash_arquivo.hexdigest()
+
+
+def _escrever_json(caminho, conteudo):
+    # escrita em arquivo temporário e os.replace: quem lê vê o arquivo antigo
+    # ou o novo, nunca um arquivo pela metade
+    temporario = caminho.with_name(f".{caminho.name}.tmp")
+    temporario.write_text(json.dumps(conteudo, indent=2, ensure_ascii=False))
+    os.replace(temporario, caminho)
+
+
+def pasta_versao(versao, pasta=PASTA_REGISTRO):
+    return Path(pasta) / f"v{versao:04d}"
+
+
+def versoes_registradas(pasta=PASTA_REGISTRO):
+    return sorted(
+        int(caminho.name[1:])
+        for caminho in Path(pasta).glob("v*")
+        if caminho.is_dir() and caminho.name[1:].isdigit()
+    )
+
+
+def reservar_versao(pasta, ocupadas, destino):
+    # o número da versão é reservado com a criação exclusiva (O_EXCL) de um
+    # arquivo .vNNNN.reserva: dois processos nunca recebem o mesmo número; a
+    # reserva de um número já publicado é descartada e o próximo é tentado
+    versao = max(ocupadas, default=0) + 1
+    while True:
+        reserva = Path(pasta) / f".v{versao:04d}.reserva"
+        try:
+            os.close(os.open(reserva, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except FileExistsError:
+            versao += 1
+            continue
+        if not destino(versao).exists():
+            return versao, reserva
+        reserva.unlink()
+        versao += 1
+
+
+def esquema_modelo(modelo):
+    return {
+        coluna: str(pd.api.types.pandas_dtype(TIPOS_MODELO.get(coluna, "float64")))
+        for coluna in modelo.feature_names_in_
+    }
+
+
+def resumir_metricas(metricas):
+    # DataFrame de organiza_resultados (uma linha por fold) -> média por modelo
+    # as colunas chegam como object quando a coluna "model" impede o to_numeric
+    if isinstance(metricas, pd.DataFrame):
+        metricas = metricas.set_index("model").apply(pd.to_numeric)
+        return metricas.groupby("model").mean().to_dict("index")
+    return metricas
+
+
+def registrar_modelo(
+    modelo,
+    metricas=None,
+    exemplo=None,
+    descricao="",
+    ativar=False,
+    pasta=PASTA_REGISTRO,
+):
+    # cada versão é uma pasta vNNNN com o modelo e os metadados; a pasta é
+    # montada com outro nome e renomeada no fim, então nunca aparece incompleta
+    pasta = Path(pasta)
+    pasta.mkdir(parents=True, exist_ok=True)
+    versao, reserva = reservar_versao(
+        pasta, versoes_registradas(pasta), lambda numero: pasta_versao(numero, pasta)
+    )
+    try:
+        _montar_versao(modelo, versao, metricas, exemplo, descricao, pasta)
+    finally:
+        # a pasta publicada já ocupa o número; a reserva só cobria a montagem
+        reserva.unlink(missing_ok=True)
+
+    if ativar:
+        ativar_versao(versao, pasta)
+
+    return versao
+
+
+def _montar_versao(modelo, versao, metricas, exemplo, descricao, pasta):
+    from joblib import dump
+
+    destino = pasta_versao(versao, pasta)
+    # o nome temporário leva o pid: restos de um processo interrompido não
+    # colidem com a montagem de outro
+    temporaria = pasta / f".{destino.name}.{os.getpid()}.tmp"
+    shutil.rmtree(temporaria, ignore_errors=True)
+    temporaria.mkdir()
+
+    dump(modelo, temporaria / ARQUIVO_MODELO)
+    # a superfície de previsões dos apps é gerada aqui, uma vez, e fica na pasta
+    # da versão: as réplicas que ativam a versão só a leem
+    construir_superficie(
+        modelo,
+        caminho_modelo=temporaria / ARQUIVO_MODELO,
+        caminho_saida=temporaria / ARQUIVO_SUPERFICIE,
+    )
+
+    import sklearn
+
+    metadados = {
+        "versao": versao,
+        "criado_em": datetime.now().isoformat(timespec="seconds"),
+        "descricao": descricao,
+        "sha256": _sha256(temporaria / ARQUIVO_MODELO),
+        "tamanho_bytes": (temporaria / ARQUIVO_MODELO).stat().st_size,
+        "sklearn": sklearn.__version__,
+        "esquema": esquema_modelo(modelo),
+        "metricas": resumir_metricas(metricas),
+        # uma linha de entrada, usada para aquecer o modelo antes da troca
+        "exemplo": (
+            json.loads(exemplo.iloc[:1].to_json(orient="records"))
+            if exemplo is not None
+            else None
+        ),
+    }
+    _escrever_json(temporaria / ARQUIVO_METADADOS, metadados)
+    os.replace(temporaria, destino)
+
+
+def carregar_metadados(versao, pasta=PASTA_REGISTRO):
+    return json.loads((pasta_versao(versao, pasta) / ARQUIVO_METADADOS).read_text())
+
+
+def ativar_versao(versao, pasta=PASTA_REGISTRO):
+    # o ponteiro é o único estado compartilhado com os servidores; voltar a uma
+    # versão anterior é apenas ativá-la de novo
+    metadados = carregar_metadados(versao, pasta)
+    if _sha256(pasta_versao(versao, pasta) / ARQUIVO_MODELO) != metadados["sha256"]:
+        raise ValueError(f"Hash do modelo da versão {versao} não confere.")
+
+    _escrever_json(
+        Path(pasta) / ARQUIVO_ATIVO,
+        {"versao": versao, "ativado_em": datetime.now().isoformat(timespec="seconds")},
+    )
+
+
+def versao_ativa(pasta=PASTA_REGISTRO):
+    try:
+        return json.loads((Path(pasta) / ARQUIVO_ATIVO).read_text())["versao"]
+    except FileNotFoundError:
+        return None
+
+
+def listar_versoes(pasta=PASTA_REGISTRO):
+    ativa = versao_ativa(pasta)
+    linhas = []
+    for versao in versoes_registradas(pasta):
+        metadados = carregar_metadados(versao, pasta)
+        metricas = next(iter((metadados["metricas"] or {}).values()), {})
+        linhas.append(
+            {
+                "versao": versao,
+                "ativa": versao == ativa,
+                "criado_em": metadados["criado_em"],
+                "descricao": metadados["descricao"],
+                "test_r2": metricas.get("test_r2"),
+                "test_neg_root_mean_squared_error": metricas.get(
+                    "test_neg_root_mean_squared_error"
+                ),
+            }
+        )
+    colunas = [
+        "versao",
+        "ativa",
+        "criado_em",
+        "descricao",
+        "test_r2",
+        "test_neg_root_mean_squared_error",
+    ]
+    return pd.DataFrame(linhas, columns=colunas).set_index("versao")
+
+
+class VersaoCarregada:
+    # modelo de uma versão e os recursos derivados dele (superfície, cache)
+
+    def __init__(self, versao, caminho, metadados, assinatura=None):
+        self.versao = versao
+        self.caminho = Path(caminho)
+        self.metadados = metadados
+        # tamanho e mtime do arquivo quando aberto; usada apenas para o
+        # caminho padrão, que pode ser sobrescrito (as versões do registro não)
+        self.assinatura = assinatura
+        self.recursos = {}
+        self._trava = threading.Lock()
+        self._modelo = None
+
+    @property
+    def caminho_superficie(self):
+        # versões do registro guardam a própria superfície; o caminho padrão
+        # usa a superfície compartilhada
+        if self.versao is None:
+            return SUPERFICIE_PREVISOES
+        return self.caminho.parent / ARQUIVO_SUPERFICIE
+
+    @property
+    def modelo(self):
+        # carregado no primeiro uso: a versão inicial de um app que só consulta
+        # a superfície não paga o import do sklearn
+        with self._trava:
+            if self._modelo is None:
+                self._modelo = carregar_modelo(self.caminho)
+        return self._modelo
+
+    def aquecer(self):
+        modelo = self.modelo
+        if not set(modelo.feature_names_in_) <= set(COLUNAS_MODELO):
+            raise ValueError(
+                f"Colunas do modelo incompatíveis: {list(modelo.feature_names_in_)}"
+            )
+        if self.metadados.get("exemplo"):
+            exemplo = pd.DataFrame.from_records(self.metadados["exemplo"])
+            modelo.predict(exemplo[list(modelo.feature_names_in_)])
+
+
+# versão ativa do registro para o caminho de serviço. Uma thread lê o ponteiro
+# a cada `intervalo` segundos; uma versão nova é carregada, aquecida e tem seus
+# recursos preparados (`preparar`) nessa thread, e só então substitui a atual
+# com uma única atribuição. Requisições em andamento terminam com a versão que
+# pegaram em atual(). Sem versão ativa no registro, usa `caminho_padrao`, que é
+# reaberto da mesma forma, com recursos novos, quando o arquivo muda
+class ModeloAtivo:
+
+    def __init__(
+        self,
+        pasta=PASTA_REGISTRO,
+        caminho_padrao=MODELO_FINAL,
+        preparar=None,
+        intervalo=INTERVALO_VERIFICACAO,
+    ):
+        self.pasta = Path(pasta)
+        self.caminho_padrao = caminho_padrao
+        self.preparar = preparar
+        self.intervalo = intervalo
+        self.trocas = 0
+        self.ultimo_erro = None
+        self._versao_com_erro = None
+        self._parar = threading.Event()
+        self._thread = None
+        self._atual = self._abrir(versao_ativa(self.pasta))
+
+    def _abrir(self, versao):
+        if versao is None:
+            versao_carregada = VersaoCarregada(
+                None, self.caminho_padrao, {}, assinatura_modelo(self.caminho_padrao)
+            )
+        else:
+            versao_carregada = VersaoCarregada(
+                versao,
+                pasta_versao(versao, self.pasta) / ARQUIVO_MODELO,
+                carregar_metadados(versao, self.pasta),
+            )
+        if self.preparar is not None:
+            versao_carregada.recursos = self.preparar(versao_carregada)
+        return versao_carregada
+
+    def atual(self):
+        return self._atual
+
+    def verificar(self):
+        versao = versao_ativa(self.pasta)
+        if versao is None:
+            # sem versão ativa, continua com a atual, a menos que ela seja o
+            # caminho padrão e ele tenha sido sobrescrito; a versão com erro é
+            # identificada pela assinatura do arquivo
+            if self._atual.versao is not None:
+                return False
+            try:
+                identificador = assinatura_modelo(self.caminho_padrao)
+            except OSError:
+                # arquivo sendo substituído ou removido: fica para a próxima leitura
+                return False
+            descricao = str(self.caminho_padrao)
+            if identificador in (self._atual.assinatura, self._versao_com_erro):
+                return False
+        else:
+            identificador, descricao = versao, f"v{versao:04d}"
+            if versao in (self._atual.versao, self._versao_com_erro):
+                return False
+
+        try:
+            nova = self._abrir(versao)
+            nova.aquecer()
+        except Exception as erro:
+            # a versão atual continua servindo; a versão com erro não é
+            # tentada de novo até que outra seja ativada
+            self._versao_com_erro = identificador
+            self.ultimo_erro = f"{descricao}: {erro}"
+            return False
+
+        self._atual = nova
+        self._versao_com_erro = None
+        self.trocas += 1
+        return True
+
+    def _acompanhar(self):
+        while not self._parar.wait(self.intervalo):
+            self.verificar()
+
+    def iniciar(self, aquecer=True):
+        # aquecer=False mantém a carga do modelo atual para o primeiro uso
+        if aquecer:
+            self._atual.aquecer()
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._acompanhar, daemon=True)
+            self._thread.start()
+        return self
+
+    def parar(self):
+        self._parar.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    # mesma interface de um modelo, para quem não precisa fixar a versão
+    @property
+    def feature_names_in_(self):
+        return self._atual.modelo.feature_names_in_
+
+    def predict(self, X):
+        return self._atual.modelo.predict(X)
+
+    def estado(self):
+        atual = self._atual
+        return {
+            "versao": atual.versao,
+            "caminho": str(atual.caminho),
+            "trocas": self.trocas,
+            "ultimo_erro": self.ultimo_erro,
+        }
+
+
+def avaliar_modelo(modelo, X, y):
+    # validação cruzada com os mesmos passos e hiperparâmetros do modelo
+    from sklearn.base import clone
+
+    from .models import organiza_resultados, treinar_e_validar_modelo_regressao
+
+    pipeline = modelo.regressor_
+    resultados = {
+        "modelo": treinar_e_validar_modelo_regressao(
+            X,
+            y,
+            clone(pipeline["reg"]),
+            clone(pipeline["preprocessor"]),
+            clone(modelo.transformer),
+        )
+    }
+    return organiza_resultados(resultados)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Registro local de versões do modelo."
+    )
+    parser.add_argument("--pasta", type=Path, default=PASTA_REGISTRO)
+    comandos = parser.add_subparsers(dest="comando", required=True)
+
+    registrar = comandos.add_parser("registrar", help="registra um modelo .joblib")
+    registrar.add_argument("caminho", nargs="?", default=MODELO_FINAL)
+    registrar.add_argument("--descricao", default="")
+    registrar.add_argument("--ativar", action="store_true")
+    registrar.add_argument(
+        "--sem-avaliacao", action="store_true", help="não calcula as métricas de CV"
+    )
+
+    ativar = comandos.add_parser("ativar", help="aponta o serviço para uma versão")
+    ativar.add_argument("versao", type=int)
+
+    comandos.add_parser("listar", help="lista as versões registradas")
+    args = parser.parse_args()
+
+    if args.comando == "registrar":
+        from .config import DADOS_LIMPOS
+
+        modelo = carregar_modelo(args.caminho)
+        df = pd.read_parquet(DADOS_LIMPOS)
+        X, y = df.drop(columns="median_house_value"), df[["median_house_value"]]
+        metricas = None if args.sem_avaliacao else avaliar_modelo(modelo, X, y)
+
+        versao = registrar_modelo(
+            modelo,
+            metricas,
+            X[list(modelo.feature_names_in_)],
+            args.descricao,
+            args.ativar,
+            args.pasta,
+        )
+        print(f"Versão {versao} registrada em {pasta_versao(versao, args.pasta)}")
+    elif args.comando == "ativar":
+        ativar_versao(args.versao, args.pasta)
+        print(f"Versão {args.versao} ativa")
+    else:
+        print(listar_versoes(args.pasta).to_string())
@@ -0,0 +1,206 @@
+import argparse
+import json
+import threading
+import time
+
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+from .condados import construir_tabela_condados
+from .previsao_lote import (
+    carregar_modelo,
+    completar_com_condados,
+    completar_com_coordenadas,
+    prever_em_lote,
+)
+from .registro import INTERVALO_VERIFICACAO, ModeloAtivo
+
+HOST = "127.0.0.1"
+PORTA = 8000
+
+# quantidade de latências recentes usadas no cálculo dos percentis
+JANELA_LATENCIAS = 10_000
+
+
+class MetricasServidor:
+    def __init__(self, janela=JANELA_LATENCIAS):
+        self._trava = threading.Lock()
+        self._latencias = deque(maxlen=janela)
+        self.inicio = time.perf_counter()
+        self.requisicoes = 0
+        self.linhas = 0
+        self.erros = 0
+
+    def registrar(self, segundos, linhas):
+        with self._trava:
+            self._latencias.append(segundos)
+            self.requisicoes += 1
+            self.linhas += linhas
+
+    def registrar_erro(self):
+        with self._trava:
+            self.erros += 1
+
+    def resumo(self):
+        with self._trava:
+            latencias_ms = np.array(self._latencias) * 1000
+            requisicoes, linhas, erros = self.requisicoes, self.linhas, self.erros
+
+        duracao = time.perf_counter() - self.inicio
+        p50, p99 = (
+            np.percentile(latencias_ms, [50, 99]) if len(latencias_ms) else (0.0, 0.0)
+        )
+
+        return {
+            "requisicoes": requisicoes,
+            "linhas": linhas,
+            "erros": erros,
+            "p50_ms": float(p50),
+            "p99_ms": float(p99),
+            "requisicoes_por_segundo": requisicoes / duracao,
+            "linhas_por_segundo": linhas / duracao,
+            "tempo_ativo_s": duracao,
+        }
+
+
+class IndiceCondadosSobDemanda:
+    # o shapely e as árvores espaciais só são carregados na primeira requisição
+    # com coordenadas, fora do caminho de inicialização do servidor
+
+    def __init__(self, tabela_condados):
+        self.tabela_condados = tabela_condados
+        self._trava = threading.Lock()
+        self._indice = None
+
+    def entradas_modelo(self, *args, **kwargs):
+        with self._trava:
+            if self._indice is None:
+                from .localizacao import IndiceCondados
+
+                self._indice = IndiceCondados.carregar(
+                    tabela_condados=self.tabela_condados
+                )
+        return self._indice.entradas_modelo(*args, **kwargs)
+
+
+def montar_entrada(registros, tabela_condados, indice_condados):
+    # aceita um objeto (previsão única) ou uma lista de objetos (lote), com
+    # todas as colunas do modelo, com longitude/latitude/housing_median_age/
+    # median_income ou apenas name/housing_median_age/median_income
+    if isinstance(registros, dict):
+        registros = [registros]
+
+    df = pd.DataFrame.from_records(registros)
+
+    if "total_rooms" in df.columns:
+        return df
+    if "longitude" in df.columns:
+        return completar_com_coordenadas(df, indice_condados)
+    return completar_com_condados(df, tabela_condados)
+
+
+def criar_manipulador(modelo, tabela_condados, indice_condados, metricas):
+
+    class ManipuladorPrevisao(BaseHTTPRequestHandler):
+
+        def _responder(self, status, conteudo):
+            corpo = json.dumps(conteudo).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(corpo)))
+            self.end_headers()
+            self.wfile.write(corpo)
+
+        def do_GET(self):
+            if self.path == "/metricas":
+                resumo = metricas.resumo()
+                if isinstance(modelo, ModeloAtivo):
+                    resumo["modelo"] = modelo.estado()
+                self._responder(200, resumo)
+            elif self.path == "/saude":
+                self._responder(200, {"status": "ok"})
+            else:
+                self._responder(404, {"erro": "rota não encontrada"})
+
+        def do_POST(self):
+            if self.path != "/prever":
+                self._responder(404, {"erro": "rota não encontrada"})
+                return
+
+            inicio = time.perf_counter()
+
+            # a requisição inteira usa a versão ativa neste instante, mesmo que
+            # uma troca aconteça durante a previsão
+            modelo_requisicao = (
+                modelo.atual().modelo if isinstance(modelo, ModeloAtivo) else modelo
+            )
+            try:
+                tamanho = int(self.headers.get("Content-Length", 0))
+                registros = json.loads(self.rfile.read(tamanho))
+                X = montar_entrada(registros, tabela_condados, indice_condados)
+                precos = prever_em_lote(modelo_requisicao, X)
+            except (ValueError, KeyError, TypeError) as erro:
+                # TypeError: JSON válido que não é objeto nem lista de objetos
+                metricas.registrar_erro()
+                mensagem = erro.args[0] if erro.args else str(erro)
+                self._responder(400, {"erro": str(mensagem)})
+                return
+
+            metricas.registrar(time.perf_counter() - inicio, len(precos))
+            self._responder(200, {"precos": precos.tolist()})
+
+        def log_message(self, format, *args):
+            # sem log por requisição; as métricas ficam em /metricas
+            pass
+
+    return ManipuladorPrevisao
+
+
+def criar_servidor(
+    host=HOST, porta=PORTA, modelo=None, tabela_condados=None, indice_condados=None
+):
+    if modelo is None:
+        # versão ativa do registro (ou MODELO_FINAL), trocada sem reiniciar
+        modelo = ModeloAtivo().iniciar()
+    if tabela_condados is None:
+        tabela_condados = construir_tabela_condados()
+    if indice_condados is None:
+        indice_condados = IndiceCondadosSobDemanda(tabela_condados)
+
+    metricas = MetricasServidor()
+    servidor = ThreadingHTTPServer(
+        (host, porta),
+        criar_manipulador(modelo, tabela_condados, indice_condados, metricas),
+    )
+    servidor.metricas = metricas
+    return servidor
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servidor HTTP de previsão de preços.")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--porta", type=int, default=PORTA)
+    parser.add_argument(
+        "--modelo", help="modelo fixo; sem ele, a versão ativa do registro"
+    )
+    parser.add_argument(
+        "--intervalo-registro", type=float, default=INTERVALO_VERIFICACAO
+    )
+    args = parser.parse_args()
+
+    if args.modelo is not None:
+        modelo = carregar_modelo(args.modelo)
+    else:
+        modelo = ModeloAtivo(intervalo=args.intervalo_registro).iniciar()
+
+    servidor = criar_servidor(args.host, args.porta, modelo)
+    print(f"Servindo em http://{args.host}:{args.porta} (POST /prever, GET /metricas)")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
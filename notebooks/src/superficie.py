@@ -0,0 +1,158 @@
+import os
+
+import numpy as np
+
+from .assinaturas import assinatura_arquivo
+from .atributos import escalar_renda
+from .condados import construir_tabela_condados, entradas_modelo_condados
+from .config import DADOS_GEO_MEDIAN, MODELO_FINAL, SUPERFICIE_PREVISOES
+
+# espaço de entrada do formulário dos apps: idade de 1 a 50 e renda de 5 a 100
+# mil US$ em passos de 5, escalada antes de entrar no modelo
+IDADES = np.arange(1, 51)
+RENDAS = escalar_renda(np.arange(5, 101, 5))
+
+
+def assinatura_modelo(caminho=MODELO_FINAL):
+    return assinatura_arquivo(caminho)
+
+
+def assinatura_superficie(caminho_modelo=MODELO_FINAL, caminho_geo=DADOS_GEO_MEDIAN):
+    # os preços dependem do modelo e da tabela de condados, montada a partir
+    # de DADOS_GEO_MEDIAN
+    return f"{assinatura_arquivo(caminho_modelo)}|{assinatura_arquivo(caminho_geo)}"
+
+
+def entradas_superficie(tabela_condados, idades=IDADES, rendas=RENDAS):
+    # todas as combinações condado x idade x renda, na ordem C do array de preços
+    condados, idades_grade, rendas_grade = np.meshgrid(
+        tabela_condados.index.to_numpy(), idades, rendas, indexing="ij"
+    )
+    return entradas_modelo_condados(
+        tabela_condados, condados.ravel(), idades_grade.ravel(), rendas_grade.ravel()
+    )
+
+
+def construir_superficie(
+    modelo=None,
+    tabela_condados=None,
+    caminho_modelo=MODELO_FINAL,
+    caminho_saida=SUPERFICIE_PREVISOES,
+    caminho_geo=DADOS_GEO_MEDIAN,
+):
+    # import local: o joblib só é necessário para gerar a superfície
+    from .previsao_lote import carregar_modelo, prever_em_lote
+
+    if modelo is None:
+        modelo = carregar_modelo(caminho_modelo)
+    if tabela_condados is None:
+        tabela_condados = construir_tabela_condados(caminho_geo)
+
+    precos = prever_em_lote(modelo, entradas_superficie(tabela_condados))
+
+    # arquivo temporário e os.replace: vários processos podem refazer a mesma
+    # superfície ao mesmo tempo, e nenhum deles pode ler um .npz pela metade
+    temporario = caminho_saida.with_name(f".{caminho_saida.name}.{os.getpid()}.tmp")
+    with open(temporario, "wb") as arquivo:
+        np.savez(
+            arquivo,
+            condados=tabela_condados.index.to_numpy(dtype=str),
+            idades=IDADES,
+            rendas=RENDAS,
+            precos=precos.reshape(len(tabela_condados), len(IDADES), len(RENDAS)),
+            assinatura=np.array(assinatura_superficie(caminho_modelo, caminho_geo)),
+        )
+    os.replace(temporario, caminho_saida)
+
+    return caminho_saida
+
+
+def _assinatura_salva(caminho):
+    # superfícies gravadas antes da assinatura com DADOS_GEO_MEDIAN não têm a
+    # chave "assinatura" e são refeitas
+    with np.load(caminho) as arquivo:
+        return str(arquivo["assinatura"]) if "assinatura" in arquivo else None
+
+
+class SuperficiePrevisoes:
+
+    def __init__(self, condados, idades, rendas, precos, assinatura=""):
+        self.condados = condados
+        self.idades = idades
+        self.rendas = rendas
+        self.precos = precos
+        self.assinatura = str(assinatura)
+        self._posicao_condado = {str(nome): i for i, nome in enumerate(condados)}
+
+    @classmethod
+    def carregar(
+        cls,
+        caminho=SUPERFICIE_PREVISOES,
+        caminho_modelo=MODELO_FINAL,
+        caminho_geo=DADOS_GEO_MEDIAN,
+    ):
+        # refaz a superfície se ela não existe ou foi gerada com outro modelo ou
+        # outros dados de condados
+        if not caminho.exists() or _assinatura_salva(caminho) != assinatura_superficie(
+            caminho_modelo, caminho_geo
+        ):
+            construir_superficie(
+                caminho_modelo=caminho_modelo,
+                caminho_saida=caminho,
+                caminho_geo=caminho_geo,
+            )
+
+        with np.load(caminho) as arquivo:
+            return cls(**{nome: arquivo[nome] for nome in arquivo.files})
+
+    def buscar(self, condado, housing_median_age, median_income):
+        # posição direta nos eixos da grade; None para entradas fora dela
+        i = self._posicao_condado.get(condado)
+        j = np.searchsorted(self.idades, housing_median_age)
+        k = np.searchsorted(self.rendas, median_income)
+
+        if (
+            i is None
+            or j == len(self.idades)
+            or k == len(self.rendas)
+            or self.idades[j] != housing_median_age
+            or not np.isclose(self.rendas[k], median_income)
+        ):
+            return None
+
+        return float(self.precos[i, j, k])
+
+    def prever(
+        self, condado, housing_median_age, median_income, modelo, tabela_condados
+    ):
+        preco = self.buscar(condado, housing_median_age, median_income)
+        if preco is not None:
+            return preco
+
+        # fora da grade: previsão com o modelo, como antes da superfície
+        entrada = entradas_modelo_condados(
+            tabela_condados, [condado], housing_median_age, median_income
+        )
+        return float(np.ravel(modelo.predict(entrada))[0])
+
+
+def validar_superficie(superficie, modelo, tabela_condados):
+    # maior erro relativo entre a tabela e o modelo em toda a grade
+    entradas = entradas_superficie(
+        tabela_condados.loc[superficie.condados], superficie.idades, superficie.rendas
+    )
+    esperado = np.ravel(modelo.predict(entradas))
+    obtido = superficie.precos.ravel()
+    return float(np.max(np.abs(obtido - esperado) / np.abs(esperado)))
+
+
+if __name__ == "__main__":
+    from .previsao_lote import carregar_modelo
+
+    caminho = construir_superficie()
+    superficie = SuperficiePrevisoes.carregar()
+    erro = validar_superficie(superficie, carregar_modelo(), construir_tabela_condados())
+    print(
+        f"Superfície com {superficie.precos.size} previsões salva em {caminho} "
+        f"(erro relativo máximo: {erro:.2e})"
+    )
@@ -0,0 +1,585 @@
+import numpy as np
+import pandas as pd
+
+from scipy import stats
+from sklearn.base import BaseEstimator, TransformerMixin, clone
+from sklearn.preprocessing import PolynomialFeatures, QuantileTransformer
+from sklearn.utils.validation import check_is_fitted, validate_data
+
+from .auxiliares import dataframe_coeficientes
+from .config import RANDOM_STATE
+from .modelo_compacto import BOUNDS_THRESHOLD
+
+
+def _potencias_termos(termos, n_colunas, nomes_colunas=None):
+    # cada termo é uma tupla de colunas, por índice ou por nome, repetidas
+    # conforme a potência: ("median_income", "median_income", "latitude") é
+    # median_income^2 latitude. A tupla vazia é o termo constante
+    posicoes = {}
+    if nomes_colunas is not None:
+        posicoes = {nome: i for i, nome in enumerate(nomes_colunas)}
+
+    potencias = np.zeros((len(termos), n_colunas), dtype=np.int64)
+    for i, termo in enumerate(termos):
+        for coluna in termo:
+            if isinstance(coluna, str):
+                if nomes_colunas is None:
+                    raise ValueError(
+                        f"Termo {termo} usa nomes, mas a entrada não tem nomes de "
+                        "colunas; use índices (por exemplo, depois do RobustScaler)"
+                    )
+                if coluna not in posicoes:
+                    raise ValueError(f"Coluna desconhecida no termo {termo}: {coluna}")
+                coluna = posicoes[coluna]
+            potencias[i, coluna] += 1
+
+    return potencias
+
+
+def _pai(termo):
+    # o "pai" de um termo é o mesmo termo sem a primeira coluna presente: na
+    # ordem do PolynomialFeatures, os termos de um grau que começam na mesma
+    # coluna e os seus pais formam blocos contíguos
+    pai = np.array(termo)
+    pai[np.flatnonzero(pai)[0]] -= 1
+    return tuple(pai.tolist())
+
+
+def _completar_pais(potencias):
+    # pais que não foram selecionados entram como termos auxiliares,
+    # calculados mas fora da saída
+    conhecidos = {tuple(termo) for termo in potencias.tolist()}
+    auxiliares = []
+    pendentes = list(conhecidos)
+    while pendentes:
+        termo = pendentes.pop()
+        if sum(termo) <= 1:
+            continue
+        pai = _pai(termo)
+        if pai not in conhecidos:
+            conhecidos.add(pai)
+            auxiliares.append(pai)
+            pendentes.append(pai)
+
+    if not auxiliares:
+        return potencias
+    return np.vstack([potencias, np.array(auxiliares, dtype=potencias.dtype)])
+
+
+def _fatia(indices):
+    # índices consecutivos viram fatia: leitura e escrita sem cópia
+    if len(indices) > 1 and np.all(np.diff(indices) == 1):
+        return slice(int(indices[0]), int(indices[-1]) + 1)
+    return indices
+
+
+def _etapas(potencias):
+    # grau a grau e, dentro do grau, um bloco por coluna: todos os termos do
+    # bloco são o pai vezes a mesma coluna, com uma única multiplicação
+    graus = potencias.sum(axis=1)
+    indices = {tuple(termo): i for i, termo in enumerate(potencias.tolist())}
+
+    etapas = []
+    for grau in range(1, graus.max(initial=0) + 1):
+        termos = np.flatnonzero(graus == grau)
+        primeiras = np.array([np.flatnonzero(potencias[t])[0] for t in termos])
+        for coluna in np.unique(primeiras):
+            bloco = termos[primeiras == coluna]
+            pais = (
+                _fatia(np.array([indices[_pai(potencias[t])] for t in bloco]))
+                if grau > 1
+                else None
+            )
+            etapas.append((_fatia(bloco), coluna, pais))
+
+    return etapas
+
+
+# substituto do PolynomialFeatures que calcula apenas os termos escolhidos.
+# Sem `termos`, gera os mesmos termos e a mesma ordem do PolynomialFeatures
+# (degree, interaction_only, include_bias têm o mesmo significado, então o
+# param_grid dos notebooks continua valendo). Com `termos`, gera só as
+# interações listadas, por exemplo as que sobraram em podar_termos. Termos por
+# nome só funcionam quando o passo recebe um DataFrame; no ramo
+# robust_scaler_poly o RobustScaler entrega um ndarray, então os termos devem
+# ser índices (como os que podar_termos devolve).
+# Os termos são calculados grau a grau em blocos contíguos. Com dtype=None a
+# saída mantém o tipo da entrada, como no PolynomialFeatures; `dtype` força
+# outro tipo, por exemplo float32
+class PolinomioSelecionado(TransformerMixin, BaseEstimator):
+
+    def __init__(
+        self,
+        degree=2,
+        interaction_only=False,
+        include_bias=True,
+        termos=None,
+        dtype=None,
+    ):
+        self.degree = degree
+        self.interaction_only = interaction_only
+        self.include_bias = include_bias
+        self.termos = termos
+        self.dtype = dtype
+
+    def fit(self, X, y=None):
+        X = validate_data(self, X, dtype=[np.float64, np.float32])
+        n_colunas = X.shape[1]
+
+        if self.termos is None:
+            self.powers_ = (
+                PolynomialFeatures(
+                    degree=self.degree,
+                    interaction_only=self.interaction_only,
+                    include_bias=self.include_bias,
+                )
+                .fit(np.zeros((1, n_colunas)))
+                .powers_
+            )
+        else:
+            self.powers_ = _potencias_termos(
+                self.termos, n_colunas, getattr(self, "feature_names_in_", None)
+            )
+
+        self.n_output_features_ = len(self.powers_)
+        self._potencias_calculo = _completar_pais(self.powers_)
+        self._etapas = _etapas(self._potencias_calculo)
+
+        return self
+
+    def transform(self, X):
+        check_is_fitted(self, "powers_")
+        X = validate_data(self, X, dtype=[np.float64, np.float32], reset=False)
+        X = np.ascontiguousarray(X.T, dtype=self.dtype or X.dtype)
+
+        # layout (termos x linhas): cada termo é uma linha contígua e a saída
+        # transposta fica em ordem de coluna, como espera o hstack do
+        # ColumnTransformer
+        X_poly = np.ones((len(self._potencias_calculo), X.shape[1]), dtype=X.dtype)
+        for termos, coluna, pais in self._etapas:
+            if pais is None:
+                X_poly[termos] = X[coluna]
+            elif isinstance(termos, slice):
+                np.multiply(X_poly[pais], X[coluna], out=X_poly[termos])
+            else:
+                X_poly[termos] = X_poly[pais] * X[coluna]
+
+        return X_poly[: self.n_output_features_].T
+
+    def _nomes_entrada(self, input_features):
+        # mesmas regras do PolynomialFeatures: nomes do fit, os informados
+        # (que devem coincidir com os do fit) ou x0, x1, ...
+        nomes_fit = getattr(self, "feature_names_in_", None)
+        if input_features is None:
+            if nomes_fit is not None:
+                return nomes_fit
+            return np.array([f"x{i}" for i in range(self.n_features_in_)], dtype=object)
+
+        input_features = np.asarray(input_features, dtype=object)
+        if nomes_fit is not None and not np.array_equal(input_features, nomes_fit):
+            raise ValueError("input_features diferente de feature_names_in_")
+        if len(input_features) != self.n_features_in_:
+            raise ValueError(
+                f"input_features deve ter {self.n_features_in_} nomes, "
+                f"recebeu {len(input_features)}"
+            )
+        return input_features
+
+    def get_feature_names_out(self, input_features=None):
+        check_is_fitted(self, "powers_")
+        nomes = self._nomes_entrada(input_features)
+
+        # mesmo formato de nome do PolynomialFeatures: "x0^2 x1"
+        saida = []
+        for potencias in self.powers_:
+            fatores = [
+                nomes[coluna] if potencia == 1 else f"{nomes[coluna]}^{potencia}"
+                for coluna, potencia in enumerate(potencias)
+                if potencia
+            ]
+            saida.append(" ".join(fatores) if fatores else "1")
+
+        return np.asarray(saida, dtype=object)
+
+
+def podar_termos(
+    modelo,
+    limiar=0.05,
+    maximo_termos=None,
+    nome_transformador="robust_scaler_poly",
+    nome_polinomio="poly",
+):
+    # termos do polinômio de um modelo treinado cujo coeficiente no Ridge tem
+    # módulo acima do limiar, na tabela de dataframe_coeficientes usada nos
+    # notebooks. Devolve tuplas de índices, aceitas em PolinomioSelecionado(termos=)
+    pipeline = getattr(modelo, "regressor_", modelo)
+    preprocessor = pipeline["preprocessor"]
+    coefs = dataframe_coeficientes(
+        np.asarray(pipeline["reg"].coef_).ravel(),
+        preprocessor.get_feature_names_out(),
+    )
+
+    prefixo = f"{nome_transformador}__"
+    coefs = coefs[coefs.index.str.startswith(prefixo)]
+    coefs.index = coefs.index.str.removeprefix(prefixo)
+
+    modulos = coefs["coeficiente"].abs()
+    mantidos = modulos[modulos > limiar].sort_values(ascending=False)
+    if maximo_termos is not None:
+        mantidos = mantidos.iloc[:maximo_termos]
+
+    # nomes de saída do polinômio -> potências, na ordem original dos termos
+    ramo = preprocessor.named_transformers_[nome_transformador]
+    polinomio = ramo[nome_polinomio]
+    nomes = list(ramo.get_feature_names_out())
+    indices = sorted(nomes.index(nome) for nome in mantidos.index)
+
+    colunas = np.arange(polinomio.powers_.shape[1])
+    return [tuple(np.repeat(colunas, polinomio.powers_[i]).tolist()) for i in indices]
+
+
+def substituir_polinomio(
+    preprocessor,
+    polinomio,
+    nome_transformador="robust_scaler_poly",
+    nome_polinomio="poly",
+):
+    # cópia não treinada do ColumnTransformer com outro passo de polinômio
+    return clone(preprocessor).set_params(
+        **{f"{nome_transformador}__{nome_polinomio}": polinomio}
+    )
+
+
+def comparar_polinomios(X, y, modelo, limiar=0.05, repeticoes=5, n_splits=5):
+    # ramo atual (PolynomialFeatures) contra PolinomioSelecionado com todos os
+    # termos e com os termos podados pelos coeficientes do modelo, no tipo da
+    # entrada e forçando float32
+    from .benchmarks import medir
+    from .models import (
+        construir_pipeline_modelo_regressao,
+        organiza_resultados,
+        treinar_e_validar_modelo_regressao,
+    )
+
+    preprocessor = modelo.regressor_["preprocessor"]
+    regressor = clone(modelo.regressor_["reg"])
+    # o QuantileTransformer subamostra o alvo; com a semente fixa as variantes
+    # diferem apenas no polinômio
+    transformer = clone(modelo.transformer).set_params(random_state=RANDOM_STATE)
+    grau = preprocessor.named_transformers_["robust_scaler_poly"]["poly"].degree
+    termos = podar_termos(modelo, limiar)
+
+    variantes = {
+        "polynomial_features": clone(preprocessor),
+        "selecionado": substituir_polinomio(
+            preprocessor, PolinomioSelecionado(degree=grau, include_bias=False)
+        ),
+        "selecionado_float32": substituir_polinomio(
+            preprocessor,
+            PolinomioSelecionado(degree=grau, include_bias=False, dtype=np.float32),
+        ),
+        f"podado_{limiar}": substituir_polinomio(
+            preprocessor, PolinomioSelecionado(termos=termos)
+        ),
+        f"podado_{limiar}_float32": substituir_polinomio(
+            preprocessor, PolinomioSelecionado(termos=termos, dtype=np.float32)
+        ),
+    }
+
+    resultados = {}
+    linhas = []
+    for nome, variante in variantes.items():
+        resultados[nome] = treinar_e_validar_modelo_regressao(
+            X, y, clone(regressor), variante, clone(transformer), n_splits=n_splits
+        )
+
+        ajustado = construir_pipeline_modelo_regressao(
+            clone(regressor), variante, clone(transformer)
+        ).fit(X, y)
+        X_transformado = ajustado.regressor_["preprocessor"].transform(X)
+        linhas.append(
+            {
+                "model": nome,
+                "n_atributos": X_transformado.shape[1],
+                "memoria_mb": X_transformado.nbytes / 1024**2,
+                "transformar_s": medir(
+                    lambda: ajustado.regressor_["preprocessor"].transform(X), repeticoes
+                )["minimo_s"],
+                "prever_s": medir(lambda: ajustado.predict(X), repeticoes)["minimo_s"],
+            }
+        )
+
+    metricas = organiza_resultados(resultados).groupby("model", sort=False).mean()
+    return pd.DataFrame(linhas).set_index("model").join(
+        metricas[["fit_time", "test_r2", "test_neg_root_mean_squared_error"]]
+    )
+
+
+# QuantileTransformer com as transformações tabeladas em uma grade densa.
+# As funções do QuantileTransformer são monótonas, então entre dois pontos da
+# grade tanto o valor exato quanto a interpolação linear ficam entre os valores
+# tabelados nas pontas: o maior salto da tabela é um limite garantido para o
+# erro (`erro_maximo_`). `erro_medido_` é o erro nos pontos médios da grade.
+# A inversa, usada em todo predict do TransformedTargetRegressor, é tabelada em
+# grade uniforme: a posição na tabela sai de uma conta, sem busca binária.
+# A direta, usada só no fit, é tabelada apenas com tabelar_direta=True
+class QuantilTabelado(TransformerMixin, BaseEstimator):
+
+    def __init__(
+        self,
+        n_quantiles=1000,
+        output_distribution="normal",
+        subsample=10_000,
+        random_state=None,
+        pontos_tabela=2**16,
+        tabelar_direta=False,
+    ):
+        self.n_quantiles = n_quantiles
+        self.output_distribution = output_distribution
+        self.subsample = subsample
+        self.random_state = random_state
+        self.pontos_tabela = pontos_tabela
+        self.tabelar_direta = tabelar_direta
+
+    @classmethod
+    def de_quantile_transformer(
+        cls, quantile, pontos_tabela=2**16, tabelar_direta=False
+    ):
+        # tabela um QuantileTransformer já treinado, sem novo ajuste
+        tabelado = cls(
+            n_quantiles=quantile.n_quantiles,
+            output_distribution=quantile.output_distribution,
+            subsample=quantile.subsample,
+            random_state=quantile.random_state,
+            pontos_tabela=pontos_tabela,
+            tabelar_direta=tabelar_direta,
+        )
+        tabelado.quantile_ = quantile
+        return tabelado._tabelar()
+
+    def fit(self, X, y=None):
+        self.quantile_ = QuantileTransformer(
+            n_quantiles=self.n_quantiles,
+            output_distribution=self.output_distribution,
+            subsample=self.subsample,
+            random_state=self.random_state,
+        ).fit(X)
+        return self._tabelar()
+
+    def _tabelar(self):
+        quantile = self.quantile_
+        self.n_features_in_ = quantile.n_features_in_
+
+        # domínio da inversa: o intervalo em que a saída do QuantileTransformer
+        # é limitada; fora dele a inversa é constante, como nas pontas da tabela
+        if self.output_distribution == "normal":
+            limite = stats.norm.ppf(1 - (BOUNDS_THRESHOLD - np.spacing(1)))
+            self.inicio_inversa_, fim = -limite, limite
+        else:
+            self.inicio_inversa_, fim = 0.0, 1.0
+        grade = np.linspace(self.inicio_inversa_, fim, self.pontos_tabela)
+        self.escala_inversa_ = (self.pontos_tabela - 1) / (fim - self.inicio_inversa_)
+
+        self.tabela_inversa_ = np.column_stack(
+            [
+                self._aplicar_coluna(quantile.inverse_transform, grade, coluna)
+                for coluna in range(self.n_features_in_)
+            ]
+        )
+        self.incrementos_inversa_ = np.diff(self.tabela_inversa_, axis=0)
+        self.erro_maximo_ = {"inversa": self.incrementos_inversa_.max(axis=0)}
+        self.erro_medido_ = {
+            "inversa": np.array(
+                [
+                    self._erro_medido(quantile.inverse_transform, grade, tabela, coluna)
+                    for coluna, tabela in enumerate(self.tabela_inversa_.T)
+                ]
+            )
+        }
+
+        if self.tabelar_direta:
+            self._tabelar_direta()
+
+        return self
+
+    def _tabelar_direta(self):
+        # grade não uniforme: pontos uniformes entre o menor e o maior quantil,
+        # os próprios quantis (onde a inclinação muda ou, com quantis repetidos,
+        # há salto) e o float logo antes de cada um. Perto dos extremos a direta
+        # é muito inclinada (a ppf da normal vai a infinito); os valores da
+        # tabela inversa, uniformes na saída, adensam a grade nesses trechos
+        quantile = self.quantile_
+        self.grade_direta_, self.tabela_direta_ = [], []
+        limites, medidos = [], []
+
+        for coluna, quantis in enumerate(quantile.quantiles_.T):
+            quebras = np.concatenate([quantis, self.tabela_inversa_[:, coluna]])
+            grade = np.unique(
+                np.concatenate(
+                    [
+                        np.linspace(quantis[0], quantis[-1], self.pontos_tabela),
+                        quebras,
+                        np.nextafter(quebras, -np.inf),
+                    ]
+                ).clip(quantis[0], quantis[-1])
+            )
+            tabela = self._aplicar_coluna(quantile.transform, grade, coluna)
+
+            # intervalos entre floats vizinhos não têm pontos internos
+            internos = np.nextafter(grade[:-1], np.inf) < grade[1:]
+            limites.append(np.diff(tabela)[internos].max())
+            medidos.append(
+                self._erro_medido(quantile.transform, grade, tabela, coluna, internos)
+            )
+            self.grade_direta_.append(grade)
+            self.tabela_direta_.append(tabela)
+
+        self.erro_maximo_["direta"] = np.array(limites)
+        self.erro_medido_["direta"] = np.array(medidos)
+
+    def _aplicar_coluna(self, funcao, valores, coluna):
+        # as funções do scikit-learn recebem todas as colunas; só `coluna` importa
+        return funcao(np.repeat(valores[:, np.newaxis], self.n_features_in_, axis=1))[
+            :, coluna
+        ]
+
+    def _erro_medido(self, funcao, grade, tabela, coluna, internos=slice(None)):
+        medios = ((grade[:-1] + grade[1:]) / 2)[internos]
+        interpolado = ((tabela[:-1] + tabela[1:]) / 2)[internos]
+        return np.abs(self._aplicar_coluna(funcao, medios, coluna) - interpolado).max()
+
+    def transform(self, X):
+        check_is_fitted(self, "quantile_")
+        if not self.tabelar_direta:
+            return self.quantile_.transform(X)
+
+        X = np.asarray(X, dtype=np.float64)
+        X_2d = X.reshape(len(X), -1)
+        saida = np.empty_like(X_2d)
+        for coluna in range(X_2d.shape[1]):
+            saida[:, coluna] = np.interp(
+                X_2d[:, coluna], self.grade_direta_[coluna], self.tabela_direta_[coluna]
+            )
+        return saida.reshape(X.shape)
+
+    def inverse_transform(self, X):
+        # sem a validação do scikit-learn a cada chamada: posição na grade
+        # uniforme, índice inteiro e interpolação com o incremento tabelado
+        check_is_fitted(self, "quantile_")
+        X = np.asarray(X, dtype=np.float64)
+        X_2d = X.reshape(len(X), -1)
+        saida = np.empty_like(X_2d)
+
+        ultimo = self.pontos_tabela - 1
+        for coluna in range(X_2d.shape[1]):
+            posicao = (X_2d[:, coluna] - self.inicio_inversa_) * self.escala_inversa_
+            np.clip(posicao, 0, ultimo, out=posicao)
+            # o clip leva ±inf para as pontas, mas NaN continua NaN e viraria um
+            # índice inválido; como no QuantileTransformer, a saída é NaN
+            nulos = np.isnan(posicao)
+            posicao[nulos] = 0
+            indices = np.minimum(posicao.astype(np.intp), ultimo - 1)
+            posicao -= indices
+            posicao *= self.incrementos_inversa_[indices, coluna]
+            posicao += self.tabela_inversa_[indices, coluna]
+            posicao[nulos] = np.nan
+            saida[:, coluna] = posicao
+
+        return saida.reshape(X.shape)
+
+
+def tabelar_alvo(modelo, pontos_tabela=2**16):
+    # troca, no próprio modelo treinado, o QuantileTransformer do alvo pela
+    # versão tabelada; os coeficientes não mudam, apenas a inversa no predict
+    modelo.transformer_ = QuantilTabelado.de_quantile_transformer(
+        modelo.transformer_, pontos_tabela
+    )
+    return modelo
+
+
+def comparar_quantis(
+    X, y, modelo, pontos_tabela=2**16, repeticoes=5, n_splits=5, n_linhas=1_000_000
+):
+    # inversa isolada em um lote grande, predict do modelo final e validação
+    # cruzada com cada transformador do alvo
+    from copy import deepcopy
+
+    from .benchmarks import medir
+    from .models import organiza_resultados, treinar_e_validar_modelo_regressao
+
+    tabelado = tabelar_alvo(deepcopy(modelo), pontos_tabela)
+    y_normal = modelo.regressor_.predict(X).reshape(-1, 1)
+    y_normal = y_normal[np.arange(n_linhas) % len(y_normal)]
+    exato = modelo.transformer_.inverse_transform(y_normal)
+
+    transformers = {
+        "quantile_transformer": (
+            modelo,
+            clone(modelo.transformer).set_params(random_state=RANDOM_STATE),
+        ),
+        f"quantil_tabelado_{pontos_tabela}": (
+            tabelado,
+            QuantilTabelado(random_state=RANDOM_STATE, pontos_tabela=pontos_tabela),
+        ),
+    }
+
+    resultados = {}
+    linhas = []
+    for nome, (ajustado, transformer) in transformers.items():
+        resultados[nome] = treinar_e_validar_modelo_regressao(
+            X,
+            y,
+            clone(modelo.regressor_["reg"]),
+            clone(modelo.regressor_["preprocessor"]),
+            transformer,
+            n_splits=n_splits,
+        )
+        linhas.append(
+            {
+                "model": nome,
+                f"inversa_{n_linhas}_s": medir(
+                    lambda: ajustado.transformer_.inverse_transform(y_normal),
+                    repeticoes,
+                )["minimo_s"],
+                "prever_s": medir(lambda: ajustado.predict(X), repeticoes)["minimo_s"],
+                "erro_medido": np.abs(
+                    ajustado.transformer_.inverse_transform(y_normal) - exato
+                ).max(),
+                "erro_maximo": getattr(
+                    ajustado.transformer_, "erro_maximo_", {"inversa": [0.0]}
+                )["inversa"][0],
+            }
+        )
+
+    metricas = organiza_resultados(resultados).groupby("model", sort=False).mean()
+    return pd.DataFrame(linhas).set_index("model").join(
+        metricas[
+            ["fit_time", "score_time", "test_r2", "test_neg_root_mean_squared_error"]
+        ]
+    )
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from joblib import load
+
+    from .config import DADOS_LIMPOS, MODELO_FINAL
+
+    parser = argparse.ArgumentParser(
+        description="Compara os transformadores com os do modelo final."
+    )
+    parser.add_argument("comparacao", choices=("polinomio", "quantis"))
+    parser.add_argument("--limiar", type=float, default=0.05)
+    parser.add_argument("--pontos-tabela", type=int, default=2**16)
+    args = parser.parse_args()
+
+    df = pd.read_parquet(DADOS_LIMPOS)
+    X, y = df.drop(columns="median_house_value"), df[["median_house_value"]]
+    modelo = load(MODELO_FINAL)
+
+    if args.comparacao == "polinomio":
+        resultado = comparar_polinomios(X, y, modelo, args.limiar)
+    else:
+        resultado = comparar_quantis(X, y, modelo, args.pontos_tabela)
+    print(resultado.round(4).to_string())
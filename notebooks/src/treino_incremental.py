@@ -0,0 +1,295 @@
+import argparse
+import time
+
+from copy import deepcopy
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from joblib import dump, load
+from scipy import stats
+
+from .config import DADOS_LIMPOS, MODELO_FINAL, PASTA_MODELOS_INCREMENTAIS
+from .registro import registrar_modelo, reservar_versao
+from .treino_streaming import (
+    COLUNA_ALVO,
+    TAMANHO_LOTE,
+    acumular_estatisticas,
+    aplicar_coeficientes,
+    iterar_lotes,
+    resolver_ridge,
+    somar_estatisticas,
+    treinar_ridge_streaming,
+)
+
+# deslocamento da mediana e variação do IQR, em unidades do IQR de referência,
+# acima dos quais o RobustScaler deixa de representar os dados novos
+LIMITE_MEDIANA = 0.25
+LIMITE_IQR = 0.5
+# p-valor do teste KS do alvo transformado contra a normal de referência
+LIMITE_KS = 1e-3
+
+
+def _colunas_transformador(preprocessor, nome):
+    for nome_transformador, transformer, colunas in preprocessor.transformers_:
+        if nome_transformador == nome:
+            return transformer, list(colunas)
+    raise KeyError(nome)
+
+
+def verificar_deriva(
+    modelo,
+    novas_linhas,
+    coluna_alvo=COLUNA_ALVO,
+    limite_mediana=LIMITE_MEDIANA,
+    limite_iqr=LIMITE_IQR,
+    limite_ks=LIMITE_KS,
+):
+    # compara as linhas novas com as estatísticas guardadas no pré-processamento
+    # e no QuantileTransformer; qualquer deriva pede reconstrução completa,
+    # porque as estatísticas suficientes só valem para a transformação atual
+    preprocessor = modelo.regressor_["preprocessor"]
+    verificacoes = []
+
+    robust_poly, colunas_robust = _colunas_transformador(
+        preprocessor, "robust_scaler_poly"
+    )
+    robust = robust_poly["robust_scaler"]
+    X = novas_linhas[colunas_robust].to_numpy(dtype=np.float64)
+    q_inferior, mediana, q_superior = np.percentile(
+        X, [robust.quantile_range[0], 50, robust.quantile_range[1]], axis=0
+    )
+
+    deslocamento = np.abs(mediana - robust.center_) / robust.scale_
+    variacao_iqr = np.abs(np.log((q_superior - q_inferior) / robust.scale_))
+    verificacoes.append(
+        {
+            "verificacao": "robust_scaler_mediana",
+            "coluna": colunas_robust[deslocamento.argmax()],
+            "valor": deslocamento.max(),
+            "limite": limite_mediana,
+        }
+    )
+    verificacoes.append(
+        {
+            "verificacao": "robust_scaler_iqr",
+            "coluna": colunas_robust[variacao_iqr.argmax()],
+            "valor": variacao_iqr.max(),
+            "limite": np.log1p(limite_iqr),
+        }
+    )
+
+    # categorias fora das conhecidas quebrariam os encoders
+    for nome in ("ordinal_encoder", "one_hot"):
+        encoder, colunas = _colunas_transformador(preprocessor, nome)
+        for coluna, categorias in zip(colunas, encoder.categories_):
+            novas = set(novas_linhas[coluna].unique()) - set(categorias.tolist())
+            verificacoes.append(
+                {
+                    "verificacao": f"{nome}_categorias",
+                    "coluna": coluna,
+                    "valor": len(novas),
+                    "limite": 0,
+                }
+            )
+
+    # sem deriva, o alvo transformado segue a distribuição de saída do
+    # QuantileTransformer; o valor é -log10 do p-valor do teste KS
+    transformer = modelo.transformer_
+    y = transformer.transform(novas_linhas[[coluna_alvo]].to_numpy(dtype=np.float64))
+    distribuicao = "norm" if transformer.output_distribution == "normal" else "uniform"
+    p_valor = stats.kstest(y.ravel(), distribuicao).pvalue
+    verificacoes.append(
+        {
+            "verificacao": "quantile_alvo_ks",
+            "coluna": coluna_alvo,
+            "valor": -np.log10(max(p_valor, 1e-300)),
+            "limite": -np.log10(limite_ks),
+        }
+    )
+
+    df_verificacoes = pd.DataFrame(verificacoes).set_index("verificacao")
+    df_verificacoes["deriva"] = df_verificacoes["valor"] > df_verificacoes["limite"]
+
+    return df_verificacoes
+
+
+def caminho_versao(versao, pasta=PASTA_MODELOS_INCREMENTAIS):
+    return Path(pasta) / f"v{versao:04d}.joblib"
+
+
+def caminho_modelo_versao(versao, pasta=PASTA_MODELOS_INCREMENTAIS):
+    return Path(pasta) / f"v{versao:04d}.modelo.joblib"
+
+
+def versoes(pasta=PASTA_MODELOS_INCREMENTAIS):
+    # só o arquivo de estado marca a versão; o do modelo é gravado antes dele
+    return sorted(
+        int(arquivo.stem[1:])
+        for arquivo in Path(pasta).glob("v*.joblib")
+        if arquivo.stem[1:].isdigit()
+    )
+
+
+def salvar_versao(estado, pasta=PASTA_MODELOS_INCREMENTAIS):
+    # cada versão são dois arquivos novos: vNNNN.modelo.joblib, só o estimador,
+    # no mesmo formato do modelo final (registrável e servível), e vNNNN.joblib,
+    # com o estado necessário para a próxima atualização; as anteriores não são
+    # alteradas
+    pasta = Path(pasta)
+    pasta.mkdir(parents=True, exist_ok=True)
+
+    versao, reserva = reservar_versao(
+        pasta, versoes(pasta), lambda numero: caminho_versao(numero, pasta)
+    )
+    estado = {
+        **estado,
+        "versao": versao,
+        "criado_em": datetime.now().isoformat(timespec="seconds"),
+    }
+
+    # escrita em arquivo temporário e rename: a versão nunca fica pela metade
+    try:
+        for conteudo, caminho in (
+            (estado["modelo"], caminho_modelo_versao(versao, pasta)),
+            (estado, caminho_versao(versao, pasta)),
+        ):
+            temporario = caminho.with_name(f".{caminho.name}.tmp")
+            dump(conteudo, temporario)
+            temporario.replace(caminho)
+    finally:
+        reserva.unlink(missing_ok=True)
+
+    return caminho_versao(versao, pasta)
+
+
+def carregar_versao(versao=None, pasta=PASTA_MODELOS_INCREMENTAIS):
+    if versao is None:
+        versao = max(versoes(pasta))
+    return load(caminho_versao(versao, pasta))
+
+
+def registrar_versao(versao=None, ativar=False, pasta=PASTA_MODELOS_INCREMENTAIS):
+    # leva o estimador de uma versão incremental ao registro, de onde os
+    # servidores o ativam sem reiniciar
+    estado = carregar_versao(versao, pasta)
+    return registrar_modelo(
+        estado["modelo"],
+        descricao=f"incremental v{estado['versao']:04d} ({estado['modo']})",
+        ativar=ativar,
+    )
+
+
+def estado_inicial(modelo=None, caminho=DADOS_LIMPOS, tamanho_lote=TAMANHO_LOTE):
+    # estatísticas suficientes de todos os dados atuais com o pré-processamento
+    # do modelo final; o Ridge resolvido a partir delas é o mesmo do notebook
+    if modelo is None:
+        modelo = load(MODELO_FINAL)
+
+    estatisticas = acumular_estatisticas(
+        modelo, iterar_lotes(caminho, None, tamanho_lote)
+    )
+    coef, intercept = resolver_ridge(estatisticas, modelo.regressor_["reg"].alpha)
+
+    return {
+        "modelo": aplicar_coeficientes(deepcopy(modelo), coef, intercept),
+        "estatisticas": estatisticas,
+        "arquivos": [str(Path(caminho).resolve())],
+        "modo": "inicial",
+    }
+
+
+def atualizar(
+    estado,
+    arquivo_novo,
+    alpha=None,
+    forcar_reconstrucao=False,
+    tamanho_lote=TAMANHO_LOTE,
+    **limites,
+):
+    # sem deriva, as linhas novas são somadas às estatísticas guardadas e o Ridge
+    # é resolvido de novo (p x p, independente do número de linhas). Como XᵀX e
+    # Xᵀy não dependem do alpha, `alpha` pode ser trocado sem custo extra.
+    # Com deriva, tudo é refeito em streaming sobre todos os arquivos
+    inicio = time.perf_counter()
+    modelo = estado["modelo"]
+    alpha = modelo.regressor_["reg"].alpha if alpha is None else alpha
+
+    novas_linhas = pd.read_parquet(arquivo_novo)
+    verificacoes = verificar_deriva(modelo, novas_linhas, **limites)
+    arquivos = [*estado["arquivos"], str(Path(arquivo_novo).resolve())]
+
+    if forcar_reconstrucao or verificacoes["deriva"].any():
+        modelo_novo, estatisticas = treinar_ridge_streaming(
+            modelo.regressor_["preprocessor"],
+            modelo.transformer,
+            alpha=alpha,
+            caminho=arquivos,
+            tamanho_lote=tamanho_lote,
+        )
+        modo = "reconstrucao"
+    else:
+        estatisticas = somar_estatisticas(
+            estado["estatisticas"], acumular_estatisticas(modelo, [novas_linhas])
+        )
+        modelo_novo = deepcopy(modelo)
+        modelo_novo.regressor_["reg"].set_params(alpha=alpha)
+        aplicar_coeficientes(modelo_novo, *resolver_ridge(estatisticas, alpha))
+        modo = "incremental"
+
+    return {
+        "modelo": modelo_novo,
+        "estatisticas": estatisticas,
+        "arquivos": arquivos,
+        "modo": modo,
+        "verificacoes": verificacoes,
+        "linhas_novas": len(novas_linhas),
+        "tempo_s": time.perf_counter() - inicio,
+    }
+
+
+def atualizar_modelo(
+    arquivo_novo,
+    pasta=PASTA_MODELOS_INCREMENTAIS,
+    alpha=None,
+    forcar_reconstrucao=False,
+):
+    # a primeira execução grava a versão inicial, a partir do modelo final
+    if not versoes(pasta):
+        salvar_versao(estado_inicial(), pasta)
+
+    estado = atualizar(
+        carregar_versao(pasta=pasta), arquivo_novo, alpha, forcar_reconstrucao
+    )
+    return salvar_versao(estado, pasta), estado
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Atualiza o modelo com um novo arquivo de linhas do censo."
+    )
+    parser.add_argument("arquivo", help="arquivo .parquet com as linhas novas")
+    parser.add_argument("--pasta", type=Path, default=PASTA_MODELOS_INCREMENTAIS)
+    parser.add_argument("--alpha", type=float)
+    parser.add_argument("--reconstruir", action="store_true")
+    parser.add_argument(
+        "--registrar", action="store_true", help="registra a versão nova"
+    )
+    parser.add_argument(
+        "--ativar", action="store_true", help="registra e ativa a versão nova"
+    )
+    args = parser.parse_args()
+
+    caminho, estado = atualizar_modelo(
+        args.arquivo, args.pasta, args.alpha, args.reconstruir
+    )
+    print(estado["verificacoes"].round(3).to_string())
+    print(
+        f"{estado['linhas_novas']} linhas, modo {estado['modo']}, "
+        f"{estado['tempo_s']:.2f} s: {caminho}"
+    )
+    if args.registrar or args.ativar:
+        versao = registrar_versao(ativar=args.ativar, pasta=args.pasta)
+        print(f"registrada como versão {versao}")
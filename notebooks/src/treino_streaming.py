@@ -0,0 +1,182 @@
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from scipy import sparse
+from sklearn.base import clone
+from sklearn.linear_model import Ridge
+
+from .config import DADOS_LIMPOS, RANDOM_STATE
+from .models import construir_pipeline_modelo_regressao
+
+COLUNA_ALVO = "median_house_value"
+TAMANHO_LOTE = 50_000
+TAMANHO_AMOSTRA = 50_000
+
+
+def iterar_lotes(caminho=DADOS_LIMPOS, colunas=None, tamanho_lote=TAMANHO_LOTE):
+    # lê o parquet grupo a grupo, sem carregar o arquivo inteiro; uma lista de
+    # caminhos é lida em sequência, como um único conjunto de dados
+    caminhos = caminho if isinstance(caminho, (list, tuple)) else [caminho]
+    for caminho in caminhos:
+        arquivo = pq.ParquetFile(caminho)
+        for lote in arquivo.iter_batches(batch_size=tamanho_lote, columns=colunas):
+            if lote.num_rows:
+                yield lote.to_pandas()
+
+
+def amostra_reservatorio(lotes, tamanho=TAMANHO_AMOSTRA, random_state=RANDOM_STATE):
+    # algoritmo R vetorizado: a linha t entra na amostra com probabilidade
+    # tamanho / (t + 1), no lugar de uma posição sorteada. Quando duas linhas do
+    # lote caem na mesma posição vale a última, como no algoritmo sequencial
+    rng = np.random.default_rng(random_state)
+    amostra = None
+    vistas = 0
+
+    for lote in lotes:
+        lote = lote.reset_index(drop=True)
+
+        if amostra is None:
+            amostra = lote.iloc[:tamanho].copy()
+        elif len(amostra) < tamanho:
+            amostra = pd.concat(
+                [amostra, lote.iloc[: tamanho - len(amostra)]], ignore_index=True
+            )
+        inicio_sorteio = min(len(lote), max(tamanho - vistas, 0))
+
+        linhas = np.arange(inicio_sorteio, len(lote))
+        sorteios = rng.integers(0, vistas + linhas + 1)
+        aceitas = sorteios < tamanho
+        if aceitas.any():
+            novas = lote.iloc[linhas[aceitas]].set_axis(sorteios[aceitas])
+            novas = novas[~novas.index.duplicated(keep="last")]
+            amostra = pd.concat([amostra.drop(index=novas.index), novas]).sort_index()
+
+        vistas += len(lote)
+
+    return amostra
+
+
+def acumular_estatisticas(modelo, lotes, coluna_alvo=COLUNA_ALVO):
+    # estatísticas suficientes do Ridge no espaço transformado: n, somas e os
+    # produtos XᵀX e Xᵀy, que ocupam p² valores qualquer que seja o número de linhas
+    preprocessor = modelo.regressor_["preprocessor"]
+    transformer = modelo.transformer_
+    colunas = list(modelo.feature_names_in_)
+
+    estatisticas = None
+    for lote in lotes:
+        X = preprocessor.transform(lote[colunas])
+        X = X.toarray() if sparse.issparse(X) else np.asarray(X, dtype=np.float64)
+        y = transformer.transform(lote[[coluna_alvo]].to_numpy(dtype=np.float64))
+
+        parcial = {
+            "n": len(X),
+            "soma_x": X.sum(axis=0),
+            "soma_y": y.sum(axis=0),
+            "xtx": X.T @ X,
+            "xty": X.T @ y,
+        }
+        estatisticas = (
+            parcial if estatisticas is None else somar_estatisticas(estatisticas, parcial)
+        )
+
+    return estatisticas
+
+
+def somar_estatisticas(a, b):
+    return {chave: a[chave] + b[chave] for chave in a}
+
+
+def resolver_ridge(estatisticas, alpha):
+    # mesmo problema do Ridge com fit_intercept=True: equações normais da
+    # matriz centrada, sem penalizar o intercepto
+    n = estatisticas["n"]
+    media_x = estatisticas["soma_x"] / n
+    media_y = estatisticas["soma_y"] / n
+
+    xtx = estatisticas["xtx"] - n * np.outer(media_x, media_x)
+    xty = estatisticas["xty"] - n * np.outer(media_x, media_y)
+    xtx[np.diag_indices_from(xtx)] += alpha
+
+    coef = np.linalg.solve(xtx, xty).T  # (n_targets, n_features), como no Ridge
+    intercept = media_y - coef @ media_x
+
+    # com um único alvo o Ridge guarda coef_ (n_features,) e intercept_ escalar
+    if coef.shape[0] == 1:
+        return coef[0], float(intercept[0])
+    return coef, intercept
+
+
+def aplicar_coeficientes(modelo, coef, intercept):
+    # os coeficientes novos ficam no formato dos que substituem, para o modelo
+    # continuar idêntico a um Ridge ajustado diretamente
+    reg = modelo.regressor_["reg"]
+    if hasattr(reg, "coef_"):
+        coef = np.reshape(coef, np.shape(reg.coef_))
+        intercept = np.reshape(intercept, np.shape(reg.intercept_))
+        if intercept.ndim == 0:
+            intercept = float(intercept)
+    reg.coef_ = coef
+    reg.intercept_ = intercept
+    return modelo
+
+
+def treinar_ridge_streaming(
+    preprocessor,
+    target_transformer,
+    alpha=1.0,
+    caminho=DADOS_LIMPOS,
+    colunas=None,
+    coluna_alvo=COLUNA_ALVO,
+    tamanho_lote=TAMANHO_LOTE,
+    tamanho_amostra=TAMANHO_AMOSTRA,
+    random_state=RANDOM_STATE,
+):
+    # 1ª passada: amostra de tamanho fixo para ajustar as estatísticas do
+    # pré-processamento (RobustScaler, categorias) e do QuantileTransformer.
+    # O modelo completo é ajustado na amostra para ficar com todos os atributos
+    # de um TransformedTargetRegressor treinado
+    amostra = amostra_reservatorio(
+        iterar_lotes(caminho, colunas, tamanho_lote), tamanho_amostra, random_state
+    )
+    X_amostra = amostra.drop(columns=coluna_alvo)
+
+    modelo = construir_pipeline_modelo_regressao(
+        Ridge(alpha=alpha), clone(preprocessor), clone(target_transformer)
+    )
+    modelo.fit(X_amostra, amostra[[coluna_alvo]])
+
+    # 2ª passada: equações normais acumuladas sobre todas as linhas, com
+    # memória limitada ao tamanho do lote e ao número de atributos
+    estatisticas = acumular_estatisticas(
+        modelo, iterar_lotes(caminho, colunas, tamanho_lote), coluna_alvo
+    )
+    coef, intercept = resolver_ridge(estatisticas, alpha)
+
+    return aplicar_coeficientes(modelo, coef, intercept), estatisticas
+
+
+if __name__ == "__main__":
+    import time
+
+    from joblib import load
+    from sklearn.metrics import r2_score
+
+    from .config import MODELO_FINAL
+
+    # mesmo pré-processamento e hiperparâmetros do modelo final, treinado em lotes
+    modelo_final = load(MODELO_FINAL)
+    inicio = time.perf_counter()
+    modelo, estatisticas = treinar_ridge_streaming(
+        modelo_final.regressor_["preprocessor"],
+        modelo_final.transformer,
+        alpha=modelo_final.regressor_["reg"].alpha,
+    )
+    duracao = time.perf_counter() - inicio
+
+    df = pd.read_parquet(DADOS_LIMPOS)
+    X, y = df.drop(columns=COLUNA_ALVO), df[COLUNA_ALVO]
+    print(f"Linhas: {estatisticas['n']}  Tempo: {duracao:.2f} s")
+    print(f"R² streaming: {r2_score(y, modelo.predict(X).ravel()):.4f}")
+    print(f"R² modelo final: {r2_score(y, modelo_final.predict(X).ravel()):.4f}")
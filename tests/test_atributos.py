@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+
+from notebooks.src.atributos import (
+    COLUNAS_MODELO,
+    TIPOS_MODELO,
+    categorizar_renda,
+    construir_entrada_modelo,
+    validar_colunas_modelo,
+)
+
+
+def _argumentos():
+    # três linhas: arrays e escalares misturados, como nos apps
+    return {
+        "longitude": np.array([-122.0, -120.0, -118.0]),
+        "latitude": np.array([38.0, 36.0, 34.0]),
+        "housing_median_age": 10,
+        "total_rooms": 2127.0,
+        "total_bedrooms": 435.5,
+        "population": 1166.0,
+        "households": 409.0,
+        "median_income": np.array([1.0, 3.5, 7.0]),
+        "ocean_proximity": "<1H OCEAN",
+        "rooms_per_household": 5.2,
+        "population_per_household": 2.8,
+        "bedrooms_per_room": 0.2,
+    }
+
+
+def test_entrada_tem_colunas_do_modelo_na_ordem():
+    entrada = construir_entrada_modelo(**_argumentos())
+
+    assert list(entrada.columns) == COLUNAS_MODELO
+    assert len(entrada) == 3
+
+
+def test_entrada_tem_tipos_do_modelo():
+    entrada = construir_entrada_modelo(**_argumentos())
+
+    for coluna, tipo in TIPOS_MODELO.items():
+        assert entrada[coluna].dtype == np.dtype(tipo), coluna
+    # colunas float32 no treinamento continuam float32
+    assert entrada["median_income"].dtype == np.float32
+    assert entrada["total_bedrooms"].dtype == np.float64
+
+
+def test_escalares_sao_repetidos_e_faixa_de_renda_calculada():
+    entrada = construir_entrada_modelo(**_argumentos())
+
+    assert (entrada["housing_median_age"] == 10).all()
+    assert (entrada["ocean_proximity"] == "<1H OCEAN").all()
+    np.testing.assert_array_equal(
+        entrada["median_income_cat"], categorizar_renda([1.0, 3.5, 7.0])
+    )
+
+
+def test_entrada_construida_passa_na_validacao():
+    validar_colunas_modelo(construir_entrada_modelo(**_argumentos()))
+
+
+def test_validacao_rejeita_coluna_faltante():
+    entrada = construir_entrada_modelo(**_argumentos()).drop(
+        columns="bedrooms_per_room"
+    )
+
+    with pytest.raises(ValueError, match="Colunas diferentes"):
+        validar_colunas_modelo(entrada)
+
+
+def test_validacao_rejeita_colunas_fora_de_ordem():
+    entrada = construir_entrada_modelo(**_argumentos())
+    colunas = COLUNAS_MODELO[1::-1] + COLUNAS_MODELO[2:]
+
+    with pytest.raises(ValueError, match="Colunas diferentes"):
+        validar_colunas_modelo(entrada[colunas])
+
+
+def test_validacao_rejeita_tipo_diferente():
+    entrada = construir_entrada_modelo(**_argumentos())
+    entrada["median_income"] = entrada["median_income"].astype(np.float64)
+
+    with pytest.raises(ValueError, match="tipo diferente"):
+        validar_colunas_modelo(entrada)
+
+
+def test_validacao_compara_com_colunas_do_treinamento():
+    entrada = construir_entrada_modelo(**_argumentos())
+
+    class ModeloReordenado:
+        feature_names_in_ = np.array(COLUNAS_MODELO[::-1])
+
+    with pytest.raises(ValueError, match="treinamento"):
+        validar_colunas_modelo(entrada, ModeloReordenado())